@@ -0,0 +1,526 @@
+'''Stand-in for pymiere's object graph, to time Premiere automation without Premiere running.'''
+
+import re
+import sys
+import json
+import codecs
+import random
+from pathlib import Path
+from time import sleep
+from collections import Counter
+from types import ModuleType, SimpleNamespace
+from urllib.parse import unquote
+
+from adobe.prproj import PremiereProject, TICKS_PER_SECOND
+
+# item types as Premiere reports them (see adobe.premiere.ITEM_TYPES)
+CLIP, BIN, ROOT = 1, 2, 3
+
+COUNT_NAMES = {'numItems', 'numSequences', 'numTracks', 'numProjects', 'length'}
+
+SCRIPT_TAG = re.compile(r'/\* yir:(\w+) \*/')
+SCRIPT_PAYLOAD = re.compile(r"^var payload = eval\('\(' \+ decodeURIComponent\('(.*)'\) \+ '\)'\);$", re.M)
+
+class Session:
+    '''Round trips made through the fake, counted by name, each with an optional delay.'''
+    def __init__(self, latency:float=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    def call(self, name:str):
+        self.calls[name] += 1
+        if self.latency:
+            sleep(self.latency)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self):
+        self.calls.clear()
+
+class remote:
+    '''An attribute that costs a round trip to read, as every pymiere property does.'''
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        obj._call(self.name)
+        return obj.__dict__[f'_{self.name}']
+
+class Remote:
+    def __init__(self, session:Session):
+        self._session = session
+
+    def _call(self, name:str):
+        self._session.call(f'{type(self).__name__.removeprefix("Fake")}.{name}')
+
+class FakeCollection(Remote):
+    '''Indexed collection; pymiere iterates by reading the count and then each index.'''
+    def __init__(self, session:Session, items:list):
+        super().__init__(session)
+        self._items = items
+
+    def __getattr__(self, name):
+        if name in COUNT_NAMES:
+            self._call(name)
+            return len(self._items)
+        raise AttributeError(name)
+
+    def __len__(self):
+        self._call('length')
+        return len(self._items)
+
+    def __getitem__(self, index:int):
+        self._call('item')
+        return self._items[index]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+class FakeTime(Remote):
+    seconds = remote()
+    ticks = remote()
+
+    def __init__(self, session:Session, seconds:float):
+        super().__init__(session)
+        self._seconds = seconds
+        self._ticks = str(round(seconds * TICKS_PER_SECOND))
+
+class FakeProjectItem(Remote):
+    name = remote()
+    type = remote()
+    nodeId = remote()
+
+    def __init__(self, session:Session, project:'FakeProject', name:str, item_type:int, node_id:str,
+                 media_path:str|None=None, actor_uuids:list[str]|None=None, color_label:int=0):
+        super().__init__(session)
+        self._project = project
+        self._parent: FakeProjectItem|None = None
+        self._children: list[FakeProjectItem] = []
+        self._name = name
+        self._type = item_type
+        self._nodeId = node_id
+        self._media_path = media_path
+        self._actor_uuids = actor_uuids
+        self._color_label = color_label
+        self._is_sequence = False
+
+    @property
+    def children(self) -> FakeCollection:
+        self._call('children')
+        return FakeCollection(self._session, self._children)
+
+    @property
+    def treePath(self) -> str:
+        self._call('treePath')
+        names = []
+        item = self
+        while item is not None and item._type != ROOT:
+            names.insert(0, item._name)
+            item = item._parent
+        return '\\' + '\\'.join([self._project._name] + names)
+
+    def isSequence(self) -> bool:
+        self._call('isSequence')
+        return self._is_sequence
+
+    def getProjectMetadata(self) -> str:
+        self._call('getProjectMetadata')
+        actors = ''
+        if self._actor_uuids:
+            actors = (f'<premierePrivateProjectMetaData:ActorUUID>{",".join(self._actor_uuids)}'
+                      '</premierePrivateProjectMetaData:ActorUUID>')
+        return f'<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?><x:xmpmeta><rdf:RDF><rdf:Description>{actors}' \
+               '</rdf:Description></rdf:RDF></x:xmpmeta><?xpacket end="w"?>'
+
+    def getMediaPath(self) -> str:
+        self._call('getMediaPath')
+        return self._media_path or ''
+
+    def getColorLabel(self) -> int:
+        self._call('getColorLabel')
+        return self._color_label
+
+    def setColorLabel(self, color_label:int):
+        self._call('setColorLabel')
+        self._color_label = color_label
+
+    def createBin(self, name:str) -> 'FakeProjectItem':
+        self._call('createBin')
+        return self._project.add_item(self, name, BIN)
+
+    def moveBin(self, target:'FakeProjectItem'):
+        self._call('moveBin')
+        self._project.move_item(self, target)
+
+    def findItemsMatchingMediaPath(self, media_path:str, ignoreSubclips:int=0) -> FakeCollection:
+        self._call('findItemsMatchingMediaPath')
+        return FakeCollection(self._session, [c for c in walk_clips(self) if c._media_path == media_path])
+
+class FakeTrackItem(Remote):
+    name = remote()
+    projectItem = remote()
+    disabled = remote()
+    start = remote()
+    end = remote()
+    inPoint = remote()
+    outPoint = remote()
+
+    def __init__(self, session:Session, project_item:FakeProjectItem|None, start:float, end:float,
+                 in_point:float, out_point:float, disabled:bool=False):
+        super().__init__(session)
+        self._name = project_item._name if project_item else ''
+        self._projectItem = project_item
+        self._disabled = disabled
+        self._start = FakeTime(session, start)
+        self._end = FakeTime(session, end)
+        self._inPoint = FakeTime(session, in_point)
+        self._outPoint = FakeTime(session, out_point)
+
+class FakeTrack(Remote):
+    def __init__(self, session:Session, clips:list[FakeTrackItem]):
+        super().__init__(session)
+        self._clips = clips
+
+    @property
+    def clips(self) -> FakeCollection:
+        self._call('clips')
+        return FakeCollection(self._session, self._clips)
+
+class FakeMarker(Remote):
+    name = remote()
+    type = remote()
+    start = remote()
+
+    def __init__(self, session:Session, name:str, marker_type:str, start:float):
+        super().__init__(session)
+        self._name = name
+        self._type = marker_type
+        self._start = FakeTime(session, start)
+
+class FakeMarkers(Remote):
+    def __init__(self, session:Session, markers:list[FakeMarker]):
+        super().__init__(session)
+        self._markers = markers
+
+    @property
+    def numMarkers(self) -> int:
+        self._call('numMarkers')
+        return len(self._markers)
+
+    def getFirstMarker(self) -> FakeMarker|None:
+        self._call('getFirstMarker')
+        return self._markers[0] if self._markers else None
+
+    def getNextMarker(self, marker:FakeMarker) -> FakeMarker|None:
+        self._call('getNextMarker')
+        i = self._markers.index(marker) + 1
+        return self._markers[i] if i < len(self._markers) else None
+
+class FakeSequence(Remote):
+    name = remote()
+    projectItem = remote()
+    end = remote()
+
+    def __init__(self, session:Session, name:str, project_item:FakeProjectItem,
+                 tracks:list[FakeTrack], markers:list[FakeMarker]):
+        super().__init__(session)
+        self._name = name
+        self._projectItem = project_item
+        self._tracks = tracks
+        self._markers = markers
+        self._end = str(max((c._end._seconds for t in tracks for c in t._clips), default=0.0) * TICKS_PER_SECOND)
+
+    @property
+    def videoTracks(self) -> FakeCollection:
+        self._call('videoTracks')
+        return FakeCollection(self._session, self._tracks)
+
+    @property
+    def markers(self) -> FakeMarkers:
+        self._call('markers')
+        return FakeMarkers(self._session, self._markers)
+
+class FakeProject(Remote):
+    name = remote()
+    path = remote()
+    rootItem = remote()
+
+    def __init__(self, session:Session, name:str, path:str=''):
+        super().__init__(session)
+        self._name = name
+        self._path = path
+        self._sequences: list[FakeSequence] = []
+        self._next_node = 0x1000000
+        self._rootItem = FakeProjectItem(session, self, name, ROOT, self.new_node_id())
+
+    @property
+    def sequences(self) -> FakeCollection:
+        self._call('sequences')
+        return FakeCollection(self._session, self._sequences)
+
+    def importFiles(self, paths:list[str], suppressUI:bool=True, targetBin:FakeProjectItem|None=None,
+                    importAsNumberedStills:bool=False) -> bool:
+        self._call('importFiles')
+        self.import_paths(paths, targetBin or self._rootItem)
+        return True
+
+    # Python-side helpers, free of round trips: they stand for work done inside Premiere
+    def new_node_id(self) -> str:
+        self._next_node += 1
+        return f'{self._next_node:08x}'
+
+    def add_item(self, parent:FakeProjectItem, name:str, item_type:int, **details) -> FakeProjectItem:
+        item = FakeProjectItem(self._session, self, name, item_type, self.new_node_id(), **details)
+        item._parent = parent
+        parent._children.append(item)
+        return item
+
+    def move_item(self, item:FakeProjectItem, target:FakeProjectItem):
+        item._parent._children.remove(item)
+        item._parent = target
+        target._children.append(item)
+
+    def import_paths(self, paths:list[str], target:FakeProjectItem):
+        known = {c._media_path for c in walk_clips(self._rootItem)}
+        for path in paths:
+            if path not in known:
+                self.add_item(target, Path(path).name, CLIP, media_path=path)
+
+    def media_by_bin(self, bin_name:str) -> dict[str, list[str]]:
+        '''Media paths under each person bin of the Videos bin'''
+        videos = find_bin(self._rootItem, bin_name)
+        return {b._name: [c._media_path for c in walk_clips(b) if c._media_path]
+                for b in (videos._children if videos else []) if b._type == BIN}
+
+def find_bin(parent:FakeProjectItem|None, name:str) -> FakeProjectItem|None:
+    for child in (parent._children if parent else []):
+        if child._type == BIN and child._name == name:
+            return child
+
+def walk_clips(item:FakeProjectItem):
+    for child in item._children:
+        if child._type == BIN:
+            yield from walk_clips(child)
+        elif child._type == CLIP:
+            yield child
+
+def snapshot_node(item:FakeProjectItem) -> dict:
+    # same shape as adobe.premiere._SNAPSHOT_SCRIPT
+    node = {'name': item._name, 'type': item._type, 'nodeId': item._nodeId}
+    if item._type in (BIN, ROOT):
+        node['children'] = [snapshot_node(c) for c in item._children]
+    else:
+        node['mediaPath'] = item._media_path or ''
+        node['colorLabel'] = item._color_label
+    return node
+
+class FakeApp(Remote):
+    '''pymiere.objects.app, plus pymiere.core.eval_script for the tagged scripts in adobe.premiere'''
+    def __init__(self, session:Session, projects:list[FakeProject]|None=None):
+        super().__init__(session)
+        self._projects = projects or []
+
+    @property
+    def projects(self) -> FakeCollection:
+        self._call('projects')
+        return FakeCollection(self._session, self._projects)
+
+    def isDocument(self, path:str) -> bool:
+        self._call('isDocument')
+        return Path(path).suffix.lower() == '.prproj'
+
+    def openDocument(self, path:str, **options) -> bool:
+        self._call('openDocument')
+        self._projects.append(from_prproj(Path(path), self._session))
+        return True
+
+    def eval_script(self, code:str):
+        # one round trip per script, whatever it does inside Premiere
+        self._session.call('eval_script')
+        # pymiere.core.eval_script escapes backslashes for the panel before sending
+        code = code.replace('\\', '\\\\')
+        tag = SCRIPT_TAG.search(code)
+        payload = SCRIPT_PAYLOAD.search(code)
+        if not (tag and payload):
+            raise ValueError('The fake only runs the tagged scripts from adobe.premiere')
+
+        # what ExtendScript makes of it: the string literal's escapes, then decodeURIComponent and eval
+        payload = json.loads(unquote(codecs.decode(payload.group(1), 'unicode_escape')))
+        project = self._projects[payload['project_index']]
+        videos = find_bin(project._rootItem, payload['bin_name'])
+
+        match tag.group(1):
+            case 'bin_snapshot':
+                result = snapshot_node(videos) if videos else None
+            case 'import_files':
+                target = find_bin(videos, payload['target_bin'])
+                result = target is not None
+                if target:
+                    project.import_paths(payload['paths'], target)
+            case 'move_items':
+                target = find_bin(videos, payload['target_bin'])
+                wanted = set(payload['node_ids'])
+                items = [c for c in walk_clips(videos) if c._nodeId in wanted] if target and videos else []
+                for item in items:
+                    project.move_item(item, target)
+                result = len(items)
+            case 'set_color_labels':
+                result = 0
+                for item in (walk_clips(videos) if videos else []):
+                    if item._nodeId in payload['labels']:
+                        item._color_label = payload['labels'][item._nodeId]
+                        result += 1
+            case name:
+                raise ValueError(f'No fake for script {name}')
+
+        # the panel replies with the ExtendJSON text, which pymiere decodes
+        return json.loads(json.dumps(result))
+
+def install(app:FakeApp) -> ModuleType:
+    '''
+    Put the fake in sys.modules as pymiere and pymiere.core. Modules that import pymiere
+    (adobe.premiere, repositories.assemble) must be imported after this.
+    '''
+    core = ModuleType('pymiere.core')
+    core.eval_script = app.eval_script
+    module = ModuleType('pymiere')
+    module.core = core
+    module.objects = SimpleNamespace(app=app)
+    sys.modules['pymiere'] = module
+    sys.modules['pymiere.core'] = core
+    return module
+
+def media_path(project:PremiereProject, video_clip) -> str|None:
+    source = project.deref(video_clip.find('Clip/Source')) if video_clip is not None else None
+    if source is not None and source.tag == 'VideoMediaSource':
+        media = project.deref(source.find('MediaSource/Media'))
+        if media is not None:
+            return media.findtext('ActualMediaFilePath') or media.findtext('FilePath') or media.findtext('RelativePath')
+
+def from_prproj(project_path:Path, session:Session) -> FakeProject:
+    '''Mirror a saved project: bins, clips with media and actors, sequences, tracks and markers'''
+    project = PremiereProject.from_file(project_path, keep_tags=None)
+    if project is None:
+        raise ValueError(f'Could not read {project_path}')
+    fake = FakeProject(session, project_path.name, str(project_path))
+
+    # master clip -> its video clip, from the master clip itself or any timeline use of it
+    video_clips = {}
+    for subclip in project.subclips():
+        master = project.deref(subclip.find('MasterClip'))
+        clip = project.deref(subclip.find('Clip'))
+        if master is not None and clip is not None and clip.tag == 'VideoClip':
+            video_clips.setdefault(master.get('ObjectUID'), clip)
+    for master in project.objects('MasterClip'):
+        for ref in master.findall('.//Clips/Clip'):
+            clip = project.deref(ref)
+            if clip is not None and clip.tag == 'VideoClip':
+                video_clips[master.get('ObjectUID')] = clip
+
+    items = {}
+    def add_children(container, parent:FakeProjectItem):
+        for ref in container.findall('.//Items/Item'):
+            elem = project.deref(ref)
+            if elem is None:
+                continue
+            if elem.tag == 'BinProjectItem':
+                add_children(elem, fake.add_item(parent, project.name(elem) or '', BIN))
+            elif elem.tag == 'ClipProjectItem':
+                master = project.deref(elem.find('MasterClip'))
+                items[elem.get('ObjectUID')] = fake.add_item(
+                    parent, project.name(elem) or '', CLIP,
+                    media_path=media_path(project, video_clips.get(master.get('ObjectUID') if master is not None else None)),
+                    actor_uuids=project.actor_uuids(elem, master))
+    for root in project.objects('RootProjectItem'):
+        add_children(root, fake._rootItem)
+
+    # the project item for each sequence, from where it is nested, else by name
+    clips_by_sequence = {}
+    sequence_items = {}
+    for sequence in project.sequences():
+        clips_by_sequence[sequence.get('ObjectUID')] = clips = []
+        for track in project.video_tracks(sequence):
+            clips.append([project.timeline_clip(i) for i in project.track_items(track)])
+            for clip in clips[-1]:
+                if clip['sequence'] is not None and clip['project_item'] is not None:
+                    sequence_items[clip['sequence'].get('ObjectUID')] = items.get(clip['project_item'].get('ObjectUID'))
+
+    by_name = {i._name: i for i in walk_clips(fake._rootItem) if not i._media_path}
+    for sequence in project.sequences():
+        uid = sequence.get('ObjectUID')
+        name = project.name(sequence) or ''
+        item = sequence_items.get(uid) or by_name.get(name) or fake.add_item(fake._rootItem, name, CLIP)
+        item._is_sequence = True
+
+        tracks = [FakeTrack(session, [FakeTrackItem(session, items.get(c['project_item'].get('ObjectUID'))
+                                                    if c['project_item'] is not None else None,
+                                                    c['start'], c['end'], c['in_point'], c['out_point'], c['disabled'])
+                                      for c in track_clips])
+                  for track_clips in clips_by_sequence[uid]]
+        markers = [FakeMarker(session, m['name'], m['type'], m['start']) for m in project.markers(sequence)]
+        fake._sequences.append(FakeSequence(session, name, item, tracks, markers))
+
+    return fake
+
+def synthetic_library(people:int=6, videos_per_person:int=40, year:int=2025) -> dict[str, list[str]]:
+    '''Reviewed video paths per person, as import_and_label would find them'''
+    return {f'Person {p + 1}': [f'/videos/{year}/Person {p + 1}/clip_{v:04}.mp4' for v in range(videos_per_person)]
+            for p in range(people)}
+
+def synthetic_project(session:Session, library:dict[str, list[str]], bin_name:str='Videos', nested:int=4,
+                      clips_per_track:int=30, imported_share:float=0.8, misplaced_share:float=0.05,
+                      seed:int=0) -> FakeProject:
+    '''
+    A project that has imported part of the library (some clips in the wrong person bin), with actors
+    on the clips, a Main timeline of three tracks cutting between clips and nested sequences, and
+    chapter markers on Main.
+    '''
+    r = random.Random(seed)
+    fake = FakeProject(session, 'Synthetic.prproj', '/projects/Synthetic.prproj')
+    videos = fake.add_item(fake._rootItem, bin_name, BIN)
+    person_bins = {person: fake.add_item(videos, person, BIN) for person in library}
+    actor_pool = [f'{i:08x}-0000-4000-8000-000000000000' for i in range(max(1, len(library)))]
+
+    clips = []
+    for person, paths in library.items():
+        for path in paths:
+            if r.random() < imported_share:
+                target = person_bins[r.choice(list(person_bins))] if r.random() < misplaced_share else person_bins[person]
+                clips.append(fake.add_item(target, Path(path).name, CLIP, media_path=path,
+                                           actor_uuids=r.sample(actor_pool, r.randint(0, min(2, len(actor_pool))))))
+
+    def track(sources:list[FakeProjectItem], n_clips:int) -> FakeTrack:
+        t = 0.0
+        track_items = []
+        for _ in range(n_clips):
+            duration = r.uniform(1, 8)
+            in_point = r.uniform(0, 5)
+            track_items.append(FakeTrackItem(session, r.choice(sources), t, t + duration, in_point, in_point + duration,
+                                             disabled=r.random() < 0.05))
+            t += duration + r.choice([0, 0, 1])
+        return FakeTrack(session, track_items)
+
+    sequences_bin = fake.add_item(fake._rootItem, 'Sequences', BIN)
+    nested_items = []
+    # each nested sequence only uses ones created after it, so nesting never loops
+    for k in reversed(range(nested)):
+        item = fake.add_item(sequences_bin, f'Nested {k + 1}', CLIP)
+        item._is_sequence = True
+        tracks = [track(clips + nested_items, max(3, clips_per_track // 5)) for _ in range(r.randint(1, 2))]
+        fake._sequences.append(FakeSequence(session, item._name, item, tracks, []))
+        nested_items.append(item)
+
+    main = fake.add_item(sequences_bin, 'Main', CLIP)
+    main._is_sequence = True
+    tracks = [track(clips + nested_items, clips_per_track) for _ in range(3)]
+    length = max(c._end._seconds for t in tracks for c in t._clips)
+    markers = [FakeMarker(session, f'Chapter {i + 1}', 'Chapter', length * i / 6) for i in range(6)]
+    markers.insert(3, FakeMarker(session, 'Note', 'Comment', length / 3 + 1))
+    fake._sequences.append(FakeSequence(session, 'Main', main, tracks, markers))
+
+    return fake
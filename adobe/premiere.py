@@ -1,52 +1,104 @@
 '''Functions to interact with Adobe Premiere Pro via pymiere.'''
 
+import os
+import json
 from time import sleep
+from urllib.parse import quote
 from pathlib import Path
-import gzip
-import xml.etree.ElementTree as ET
 
 import pymiere
+import pymiere.core
 
 from common.console import SplitConsole
 from common.structure import ADOBE_BIN, write_json, PR_LABEL_EX
 from common.system import file_type, mount_premiere
+from adobe.prproj import place_appearances, round_appearances
 
 ITEM_TYPES = {1: 'CLIP', 2: 'BIN', 3: 'ROOT', 4: 'FILE'}
 
+# ExtendScript run in one round trip each; the header tag names the script and payload holds its inputs
+# (results go back through ExtendJSON, the serializer pymiere's panel loads into Premiere)
+_SCRIPT_HELPERS = '''
+var project = app.projects[payload.project_index];
+function findBin(parent, name) {
+    for (var i = 0; i < parent.children.numItems; i++) {
+        var c = parent.children[i];
+        if (c.type == 2 && c.name == name) return c;
+    }
+    return null;
+}
+var videos = findBin(project.rootItem, payload.bin_name);
+'''
+
+_SNAPSHOT_SCRIPT = '''
+function walk(item) {
+    var node = {name: item.name, type: item.type, nodeId: item.nodeId};
+    if (item.type == 2 || item.type == 3) {
+        node.children = [];
+        for (var i = 0; i < item.children.numItems; i++) node.children.push(walk(item.children[i]));
+    } else {
+        node.mediaPath = item.getMediaPath();
+        node.colorLabel = item.getColorLabel();
+    }
+    return node;
+}
+videos ? ExtendJSON.stringify(walk(videos)) : 'null';
+'''
+
+_IMPORT_SCRIPT = '''
+var target = videos ? findBin(videos, payload.target_bin) : null;
+target ? ExtendJSON.stringify(project.importFiles(payload.paths, payload.suppress_ui, target, false)) : 'false';
+'''
+
+_MOVE_SCRIPT = '''
+function collect(item, wanted, found) {
+    for (var i = 0; i < item.children.numItems; i++) {
+        var c = item.children[i];
+        if (c.type == 2) collect(c, wanted, found);
+        else if (wanted[c.nodeId]) found.push(c);
+    }
+    return found;
+}
+var target = videos ? findBin(videos, payload.target_bin) : null;
+var wanted = {};
+for (var i = 0; i < payload.node_ids.length; i++) wanted[payload.node_ids[i]] = true;
+var items = target ? collect(videos, wanted, []) : [];
+for (var i = 0; i < items.length; i++) items[i].moveBin(target);
+ExtendJSON.stringify(items.length);
+'''
+
+_LABEL_SCRIPT = '''
+function relabel(item, labels) {
+    var n = 0;
+    for (var i = 0; i < item.children.numItems; i++) {
+        var c = item.children[i];
+        if (c.type == 2) n += relabel(c, labels);
+        else if (labels.hasOwnProperty(c.nodeId)) { c.setColorLabel(labels[c.nodeId]); n++; }
+    }
+    return n;
+}
+ExtendJSON.stringify(videos ? relabel(videos, payload.labels) : 0);
+'''
+
+def encode_payload(payload:dict) -> str:
+    '''
+    ExtendScript that rebuilds payload in Premiere. pymiere.core.eval_script doubles every backslash
+    in the code it sends, which would break JSON escapes (Jos\\u00e9, C:\\Users, \\"), so the JSON
+    travels percent-encoded, with no backslashes or quotes left to double.
+    '''
+    return f"eval('(' + decodeURIComponent('{quote(json.dumps(payload), safe='')}') + ')')"
+
+def run_script(name:str, script:str, payload:dict):
+    '''Evaluate one tagged ExtendScript in Premiere and decode its JSON result.'''
+    code = f'/* yir:{name} */\nvar payload = {encode_payload(payload)};\n{_SCRIPT_HELPERS}{script}'
+    result = pymiere.core.eval_script(code)
+    return json.loads(result) if isinstance(result, str) and result else result
+
 ## TODO:
 ## projectitem.getMediaPath()
 ## project.consolidateDuplicates()
 # # app.project.rootItem.children[index].getProjectColumnsMetadata() -> 'Video Usage'
 
-# see what's already used
-def convert_to_xml(project_path:Path) -> ET.Element|None:
-    if file_type(project_path) == 'PREMIERE_PROJECT':
-        with gzip.open(project_path, 'rb') as f:
-            xml_content = f.read()
-
-        return ET.fromstring(xml_content)
-
-def extract_included_video_paths(root:ET.Element) -> list[str]:
-    # returns all videos already imported into the project
-    master_clips_urefs = [v.find('MediaSource').find('Media').get('ObjectURef')
-                          for v in root.findall('VideoMediaSource')]
-    media_paths = [m.find('RelativePath').text for m in root.findall('Media')
-                   if m.get('ObjectUID') in master_clips_urefs and m.find('RelativePath') is not None]
-
-    return media_paths
-
-def extract_used_video_paths(root:ET.Element) -> list[str]:
-    # returns all videos actually used in the timeline
-    clip_refs = [c.find('Clip').get('ObjectRef') for c in root.findall('SubClip')]
-    subbed_clips = [c for c in root.findall('VideoClip') if c.get('ObjectID') in clip_refs]
-    source_refs = set(c.find('Clip').find('Source').get('ObjectRef') for c in subbed_clips)
-    master_clips_urefs = [v.find('MediaSource').find('Media').get('ObjectURef')
-                          for v in root.findall('VideoMediaSource') if v.get('ObjectID') in source_refs]
-    media_paths = [m.find('RelativePath').text for m in root.findall('Media')
-                   if m.get('ObjectUID') in master_clips_urefs and m.find('RelativePath') is not None]
-
-    return media_paths
-
 # bring new items into Premiere
 def open_premiere():
     '''Ensure Premiere Pro is running.'''
@@ -126,32 +178,74 @@ def set_color_label(project_item, color):
     if get_color_label(project_item) != color:
         project_item.setColorLabel(color)
 
-def set_family_color_labels(videos_bin, label_map):
-    '''Set color labels for clips in person bins based on family membership.'''
-    for c_bin in videos_bin.children:
-        if ITEM_TYPES[c_bin.type] == 'BIN':
-            family_color_label = label_map.get(c_bin.name)
+def get_label_changes(snapshot:dict, label_map:dict[str, int]) -> dict[str, int]:
+    '''Node ID -> color label for clips directly in a person bin whose label differs from the family's.'''
+    changes = {}
+    for c_bin in (snapshot or {}).get('children', []):
+        if ITEM_TYPES.get(c_bin['type']) == 'BIN':
+            family_color_label = label_map.get(c_bin['name'])
             if family_color_label:
-                for c_item in c_bin.children:
-                    if ITEM_TYPES[c_item.type] == 'CLIP':
-                        set_color_label(c_item, family_color_label)
+                for c_item in c_bin.get('children', []):
+                    if ITEM_TYPES.get(c_item['type']) == 'CLIP' and c_item.get('colorLabel') != family_color_label:
+                        changes[c_item['nodeId']] = int(family_color_label)
+    return changes
+
+def set_family_color_labels(project_id:int, label_map:dict[str, int], snapshot:dict|None=None,
+                            bin_name:str=ADOBE_BIN) -> int:
+    '''Set color labels for clips in person bins based on family membership, in one script call.'''
+    snapshot = snapshot or get_bin_snapshot(project_id, bin_name)
+    changes = get_label_changes(snapshot, label_map)
+    if changes:
+        return run_script('set_color_labels', _LABEL_SCRIPT,
+                          {'project_index': project_id, 'bin_name': bin_name, 'labels': changes})
+    return 0
 
 def check_video_in_bin(videos_bin, video_path:Path):
     return videos_bin.findItemsMatchingMediaPath(str(video_path), ignoreSubclips=1).length > 0
 
-def import_videos(project_id, videos_bin, person_name:str, import_file_list:list[Path], ui:SplitConsole, dry_run=True):
-    import_success = False
+def media_key(path:Path|str) -> str:
+    return os.path.normcase(os.path.normpath(str(path)))
+
+def get_bin_snapshot(project_id:int, bin_name:str=ADOBE_BIN) -> dict|None:
+    '''The whole Videos bin tree (names, types, node IDs, media paths, color labels) in one call.'''
+    return run_script('bin_snapshot', _SNAPSHOT_SCRIPT, {'project_index': project_id, 'bin_name': bin_name})
 
-    person_bin = find_person_bin(videos_bin, person_name)
+def snapshot_clips(node:dict, bin_name:str|None=None):
+    '''(clip, name of the person bin holding it, at any depth) for every clip under the Videos bin'''
+    for child in node.get('children', []):
+        if ITEM_TYPES.get(child['type']) == 'BIN':
+            yield from snapshot_clips(child, bin_name or child['name'])
+        else:
+            yield child, bin_name
 
-    # videos that should be in this bin
-    importable_videos = [p for p in import_file_list if not check_video_in_bin(videos_bin, p)]
-    # videos that already exist in this bin
-    existing_videos = [p for p in import_file_list if check_video_in_bin(person_bin, p)]
-    # videos that already exist in another bin
-    movable_videos = [p for p in existing_videos if not check_video_in_bin(person_bin, p)]
+def import_files(project_id:int, person_name:str, file_paths:list[Path], bin_name:str=ADOBE_BIN) -> bool:
+    return run_script('import_files', _IMPORT_SCRIPT,
+                      {'project_index': project_id, 'bin_name': bin_name, 'target_bin': person_name,
+                       'paths': [str(p) for p in file_paths], 'suppress_ui': False})
 
-    skipped_imports = len(existing_videos) - (len(importable_videos) + len(movable_videos))
+def move_items(project_id:int, person_name:str, node_ids:list[str], bin_name:str=ADOBE_BIN) -> int:
+    return run_script('move_items', _MOVE_SCRIPT,
+                      {'project_index': project_id, 'bin_name': bin_name, 'target_bin': person_name,
+                       'node_ids': node_ids})
+
+def import_videos(project_id, snapshot:dict, person_name:str, import_file_list:list[Path], ui:SplitConsole, dry_run=True):
+    import_success = False
+
+    # where each video already sits in the Videos bin, from one snapshot instead of a probe per path
+    clips_by_path: dict[str, list[tuple[dict, str|None]]] = {}
+    for clip, bin_name in snapshot_clips(snapshot or {}):
+        if clip.get('mediaPath'):
+            clips_by_path.setdefault(media_key(clip['mediaPath']), []).append((clip, bin_name))
+
+    # videos that aren't in the project yet
+    importable_videos = [p for p in import_file_list if media_key(p) not in clips_by_path]
+    # videos already in this bin, left alone even if another bin holds a copy too
+    in_person_bin = {media_key(p) for p in import_file_list
+                     if any(bin_name == person_name for _, bin_name in clips_by_path.get(media_key(p), []))}
+    skipped_imports = sum(1 for p in import_file_list if media_key(p) in in_person_bin)
+    # videos already imported, but only into other bins
+    movable_clips = [clip for p in import_file_list if media_key(p) not in in_person_bin
+                     for clip, bin_name in clips_by_path.get(media_key(p), []) if bin_name != person_name]
 
     if skipped_imports > 0:
         v_s = 's' if skipped_imports != 1 else ''
@@ -161,19 +255,14 @@ def import_videos(project_id, videos_bin, person_name:str, import_file_list:list
         # import videos into the person's bin in Premiere
         v_s = 's' if len(importable_videos) != 1 else ''
         ui.add_update(f'Importing {len(importable_videos)} video{v_s}...')
-        person_bin = find_person_bin(videos_bin, person_name)
-        if person_bin:
-            if not dry_run:
-                import_success = pymiere.objects.app.project.importFiles(arrayOfFilePathsToImport=[str(p) for p in importable_videos],
-                                                                         suppressUI=False, targetBin=person_bin, importAsNumberedStills=False)
-
-    if movable_videos:
-        v_s = 's' if len(movable_videos) != 1 else ''
-        ui.add_update(f'Moving {len(movable_videos)} video{v_s} to {person_name} bin...')
-        for file_path in movable_videos:
-            for item in videos_bin.findItemsMatchingMediaPath(str(file_path), ignoreSubclips=1):
-                if not dry_run:
-                    item.moveBin(person_bin)
+        if not dry_run:
+            import_success = import_files(project_id, person_name, importable_videos)
+
+    if movable_clips:
+        v_s = 's' if len(movable_clips) != 1 else ''
+        ui.add_update(f'Moving {len(movable_clips)} video{v_s} to {person_name} bin...')
+        if not dry_run:
+            move_items(project_id, person_name, [c['nodeId'] for c in movable_clips])
 
     return import_success
 
@@ -205,68 +294,75 @@ def get_sequence_maps(project_id):
 def get_sequence(project_id, sequence_id):
     return pymiere.objects.app.projects[project_id].sequences[sequence_id]
 
-def get_actors_in_sequence(sequence_item, project_id, sequence_map,
-                           seq_start=0, seq_in=0, seq_out=0, ## should also be looking just at things after in and before out
-                           banned_bins=[], banned_nodes=[]): 
+def read_actor_uuids(metadata:str) -> list[str]|None:
+    actor_field = 'ActorUUID'
+    premiere_private = 'premierePrivateProjectMetaData'
+    searchword = f'<{premiere_private}:{actor_field}>'
+    if searchword in metadata:
+        return metadata[metadata.find(searchword)+len(searchword):
+                        metadata.find(searchword.replace('<', '</'))].split(',')
+
+def describe_project_item(project_item, project_name:str, banned_bins:list[str]|None) -> dict:
+    '''What the actor pass needs from a project item, fetched once per item.'''
+    tree_path = project_item.treePath if banned_bins else ''
+    allowed = not banned_bins or not any(tree_path.startswith(f'\\{project_name}\\{b}\\') for b in banned_bins)
+    is_sequence = allowed and project_item.isSequence()
+    actor_uuids = read_actor_uuids(project_item.getProjectMetadata()) if allowed and not is_sequence else None
+    return {'allowed': allowed, 'is_sequence': is_sequence, 'actor_uuids': actor_uuids}
+
+def get_actors_in_sequence(sequence_item, project_id, sequence_map, banned_bins:list[str]|None=None,
+                           sequence_cache:dict[str, list[dict]]|None=None, item_cache:dict[str, dict]|None=None,
+                           project_name:str|None=None) -> list[dict]:
+    '''
+    Actor appearances in a sequence, in the sequence's own time. Each nested sequence is walked once
+    per run and then shifted and trimmed for every placement; each project item is described once.
+    '''
     print(f'Looking in sequence {sequence_item.name}...')
+    sequence_cache = {} if sequence_cache is None else sequence_cache
+    item_cache = {} if item_cache is None else item_cache
+    project_name = project_name or pymiere.objects.app.projects[project_id].name
     actor_appearances = []
 
-    if not seq_out:
-        seq_out = sequence_item.end / 254016000000
-
     for v_track in sequence_item.videoTracks:
         for clip in v_track.clips:
 
             # check if clip has visible video
-            if clip.projectItem and not clip.disabled:
-                project_item = clip.projectItem
-
-                # check if this is automatically ruled out
-                if ((banned_bins is None) 
-                    or
-                    not any(project_item.treePath.startswith(f'\\{pymiere.objects.app.projects[project_id].name}\\{b}\\') for b in banned_bins)):
-
-                    # check if item is in visible timeline
-                    if not(clip.start.seconds >= seq_out or clip.end.seconds < seq_in):
-                        start_time = seq_start + max(seq_in, clip.start.seconds)
-                        end_time = seq_start + min(seq_out, clip.end.seconds)
-
-                        # check if sequence that hasn't been ruled out
-                        if project_item.isSequence() and project_item.nodeId not in banned_nodes:
-                            next_sequence_item = get_sequence(project_id, sequence_map[project_item.nodeId])
-                            actor_subappearances = get_actors_in_sequence(next_sequence_item, project_id, sequence_map,
-                                                                            seq_start=start_time + clip.inPoint.seconds,
-                                                                            seq_in=clip.inPoint.seconds, seq_out=clip.outPoint.seconds,
-                                                                            banned_bins=banned_bins, banned_nodes=banned_nodes)
-                            if not actor_subappearances:
-                                # there are no appearances in here, so don't check again
-                                banned_nodes.append(project_item.nodeId)
-
-                            else:
-                                # this sequence has appearances
-                                actor_appearances.extend(actor_subappearances)
-
-                        else:
-                            # actual video content potentially with actors
-                            metadata = project_item.getProjectMetadata()
-                            actor_field = 'ActorUUID'
-                            premiere_private = 'premierePrivateProjectMetaData'
-                            searchword = f'<{premiere_private}:{actor_field}>'
-                            if searchword in metadata:
-                                actor_uuids = metadata[metadata.find(searchword)+len(searchword):
-                                                       metadata.find(searchword.replace('<', '</'))].split(',')
-                                actor_appearances.append({'actor_uuid': actor_uuids,
-                                                          'start_time': round(start_time, 2),
-                                                          'end_time': round(end_time, 2)})
+            project_item = clip.projectItem
+            if not project_item or clip.disabled:
+                continue
+
+            node_id = project_item.nodeId
+            if node_id not in item_cache:
+                item_cache[node_id] = describe_project_item(project_item, project_name, banned_bins)
+            item = item_cache[node_id]
+
+            # check if this is automatically ruled out
+            if not item['allowed']:
+                continue
+
+            if item['is_sequence']:
+                if node_id not in sequence_cache:
+                    sequence_cache[node_id] = [] # a sequence nested in itself adds nothing
+                    next_sequence_item = get_sequence(project_id, sequence_map[node_id])
+                    sequence_cache[node_id] = get_actors_in_sequence(next_sequence_item, project_id, sequence_map,
+                                                                     banned_bins, sequence_cache, item_cache, project_name)
+                actor_appearances.extend(place_appearances(sequence_cache[node_id], clip.start.seconds,
+                                                           clip.inPoint.seconds, clip.outPoint.seconds))
+
+            elif item['actor_uuids']:
+                # actual video content with actors
+                actor_appearances.append({'actor_uuid': item['actor_uuids'],
+                                          'start_time': clip.start.seconds, 'end_time': clip.end.seconds})
 
     return actor_appearances
 
-def get_actors_in_project(project_id, sequence_name, sequence_map_by_name, sequence_map_by_node, banned_bins=[]):
+def get_actors_in_project(project_id, sequence_name, sequence_map_by_name, sequence_map_by_node, banned_bins=None):
     print(f'Pulling up main sequence')
 
     if sequence_name in sequence_map_by_name:
         sequence_item = get_sequence(project_id, sequence_map_by_name.get(sequence_name))
-        return get_actors_in_sequence(sequence_item, project_id, sequence_map_by_node, banned_bins=banned_bins)
+        return round_appearances(get_actors_in_sequence(sequence_item, project_id, sequence_map_by_node,
+                                                        banned_bins=banned_bins))
 
 def get_chapter_markers(project_id, sequence_name, sequence_map_by_name):
     print('Getting chapter markers')
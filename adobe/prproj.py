@@ -0,0 +1,297 @@
+'''Functions to read Premiere project files directly, without Premiere running.'''
+
+from pathlib import Path
+import re
+import json
+import gzip
+from functools import cached_property
+import xml.etree.ElementTree as ET
+
+# kept free of common.structure so worker processes can import it cheaply
+PROJECT_EXT = '.prproj'
+
+TICKS_PER_SECOND = 254016000000
+
+# top-level objects needed to trace media into the timeline
+MEDIA_TAGS = {'Media', 'VideoMediaSource', 'VideoClip', 'SubClip', 'Sequence'}
+
+# project item metadata is an XMP packet stored as text, with ActorUUID as an element or an attribute
+ACTOR_PATTERN = re.compile(r'premierePrivateProjectMetaData:ActorUUID(?:>|=")([^<"]*)')
+
+def convert_to_xml(project_path:Path, keep_tags:set[str]|None=MEDIA_TAGS) -> ET.Element|None:
+    '''
+    Stream the gzipped project and keep only the top-level objects in keep_tags (all if None).
+    Everything else is cleared as soon as it has been parsed, so neither the decompressed
+    XML nor the full element tree is ever held in memory.
+    '''
+    if project_path.suffix.lower() != PROJECT_EXT or not project_path.is_file():
+        return None
+
+    slim_root = None
+    depth = 0
+    with gzip.open(project_path, 'rb') as f:
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if depth == 0:
+                    root = elem
+                    slim_root = ET.Element(elem.tag, elem.attrib)
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1:
+                # a finished project object: move it across or drop it
+                if keep_tags is None or elem.tag in keep_tags:
+                    slim_root.append(elem)
+                else:
+                    elem.clear()
+                root.clear()
+
+    return slim_root
+
+class PremiereProject:
+    '''
+    Top-level project objects indexed in one pass. Objects point at each other with
+    ObjectRef (-> ObjectID) and ObjectURef (-> ObjectUID), so every hop is a dict lookup.
+    '''
+    def __init__(self, root:ET.Element):
+        self.root = root
+        self.by_id: dict[str, ET.Element] = {}
+        self.by_uid: dict[str, ET.Element] = {}
+        self.by_tag: dict[str, list[ET.Element]] = {}
+
+        for elem in root:
+            if (object_id := elem.get('ObjectID')) is not None:
+                self.by_id[object_id] = elem
+            if (object_uid := elem.get('ObjectUID')) is not None:
+                self.by_uid[object_uid] = elem
+            self.by_tag.setdefault(elem.tag, []).append(elem)
+
+    @classmethod
+    def from_file(cls, project_path:Path, keep_tags:set[str]|None=MEDIA_TAGS):
+        root = convert_to_xml(project_path, keep_tags)
+        if root is not None:
+            return cls(root)
+
+    def deref(self, pointer:ET.Element|None) -> ET.Element|None:
+        ''' Follow an ObjectRef or ObjectURef child to the object it points at '''
+        if pointer is None:
+            return None
+        if (ref := pointer.get('ObjectRef')) is not None:
+            return self.by_id.get(ref)
+        if (uref := pointer.get('ObjectURef')) is not None:
+            return self.by_uid.get(uref)
+
+    def objects(self, tag:str) -> list[ET.Element]:
+        return self.by_tag.get(tag, [])
+
+    def sequences(self) -> list[ET.Element]:
+        return self.objects('Sequence')
+
+    def subclips(self) -> list[ET.Element]:
+        return self.objects('SubClip')
+
+    def name(self, elem:ET.Element) -> str|None:
+        return elem.findtext('Name') or elem.findtext('ProjectItem/Name')
+
+    def sequence_by_name(self, sequence_name:str) -> ET.Element|None:
+        for sequence in self.sequences():
+            if self.name(sequence) == sequence_name:
+                return sequence
+
+    @cached_property
+    def project_items(self) -> dict[str, ET.Element]:
+        # MasterClip ObjectUID -> the ClipProjectItem that shows it in a bin
+        return {m.get('ObjectURef'): item for item in self.objects('ClipProjectItem')
+                if (m := item.find('MasterClip')) is not None}
+
+    @cached_property
+    def parents(self) -> dict[str, ET.Element]:
+        # project item ObjectUID -> the bin (or root) holding it
+        return {i.get('ObjectURef'): container
+                for container in self.objects('BinProjectItem') + self.objects('RootProjectItem')
+                for i in container.findall('.//Items/Item')}
+
+    def bin_path(self, project_item:ET.Element) -> list[str]:
+        ''' Names of the bins above a project item, outermost first '''
+        path = []
+        parent = self.parents.get(project_item.get('ObjectUID'))
+        while parent is not None and parent.tag == 'BinProjectItem':
+            path.insert(0, self.name(parent))
+            parent = self.parents.get(parent.get('ObjectUID'))
+        return path
+
+    def video_tracks(self, sequence:ET.Element) -> list[ET.Element]:
+        tracks = []
+        for track_group in sequence.findall('.//TrackGroups/TrackGroup'):
+            group = self.deref(track_group.find('Second'))
+            if group is not None and group.tag == 'VideoTrackGroup':
+                tracks.extend(t for t in map(self.deref, group.findall('.//Tracks/Track')) if t is not None)
+        return tracks
+
+    def track_items(self, track:ET.Element) -> list[ET.Element]:
+        # clips only, transitions are kept in a separate list
+        return [i for i in map(self.deref, track.findall('.//ClipItems/TrackItems/TrackItem')) if i is not None]
+
+    @staticmethod
+    def seconds(elem:ET.Element|None, path:str) -> float:
+        # times are stored in ticks and left out when zero
+        text = elem.findtext(path) if elem is not None else None
+        return int(text) / TICKS_PER_SECOND if text else 0.0
+
+    def timeline_clip(self, track_item:ET.Element) -> dict:
+        ''' What Premiere's TrackItem reports: timing, in/out points, project item and any nested sequence '''
+        subclip = self.deref(track_item.find('.//SubClip'))
+        video_clip = self.deref(subclip.find('Clip')) if subclip is not None else None
+        master_clip = self.deref(subclip.find('MasterClip')) if subclip is not None else None
+        source = self.deref(video_clip.find('Clip/Source')) if video_clip is not None else None
+
+        nested = None
+        if source is not None and source.tag == 'VideoSequenceSource':
+            nested = self.deref(source.find('.//SequenceSource/Sequence'))
+
+        return {'start': self.seconds(track_item, './/TrackItem/Start'),
+                'end': self.seconds(track_item, './/TrackItem/End'),
+                'in_point': self.seconds(video_clip, 'Clip/InPoint'),
+                'out_point': self.seconds(video_clip, 'Clip/OutPoint'),
+                'disabled': (track_item.findtext('.//Disabled') or '').lower() == 'true',
+                'project_item': self.project_items.get(master_clip.get('ObjectUID')) if master_clip is not None else None,
+                'master_clip': master_clip,
+                'sequence': nested}
+
+    def actor_uuids(self, project_item:ET.Element, master_clip:ET.Element|None=None) -> list[str]|None:
+        ''' ActorUUID project metadata, looked for on the item, its master clip and what they point at '''
+        owners = [project_item] + ([master_clip] if master_clip is not None else [])
+        owners += [o for e in list(owners) for o in map(self.deref, e) if o is not None]
+        for owner in owners:
+            for text in owner.itertext():
+                if (found := ACTOR_PATTERN.search(text)):
+                    return found.group(1).split(',')
+
+    def markers(self, sequence:ET.Element) -> list[dict]:
+        '''
+        Markers on a sequence, in time order. Newer projects keep each one as DVAMarker JSON,
+        older ones as Marker elements; both are read, from the sequence or the Markers object it points at.
+        '''
+        owners = [sequence] + [o for o in map(self.deref, sequence.iter('Markers')) if o is not None]
+
+        markers = []
+        for owner in owners:
+            for elem in owner.iter('DVAMarker'):
+                try:
+                    marker = json.loads(elem.text or '')
+                except ValueError:
+                    continue
+                marker = marker.get('DVAMarker', marker) if isinstance(marker, dict) else {}
+                start = marker.get('mStartTime', {})
+                start = start.get('ticks', 0) if isinstance(start, dict) else start
+                markers.append({'name': marker.get('mName', ''), 'type': str(marker.get('mType', '')),
+                                'start': int(start or 0) / TICKS_PER_SECOND})
+
+            for elem in owner.iter('Marker'):
+                if elem.get('ObjectRef') or elem.get('ObjectURef'):
+                    continue
+                markers.append({'name': elem.findtext('Name') or '',
+                                'type': elem.findtext('Type') or elem.findtext('MarkerType') or '',
+                                'start': self.seconds(elem, 'Start') or self.seconds(elem, 'StartTime')})
+
+        return sorted(markers, key=lambda x: x['start'])
+
+    def media_paths(self, media_uids:set[str]) -> list[str]:
+        # project order, as Premiere lists them
+        return [m.find('RelativePath').text for m in self.objects('Media')
+                if m.get('ObjectUID') in media_uids and m.find('RelativePath') is not None]
+
+    def included_media(self) -> list[str]:
+        ''' Relative paths of every video imported into the project '''
+        media_uids = {v.find('MediaSource/Media').get('ObjectURef') for v in self.objects('VideoMediaSource')}
+        return self.media_paths(media_uids)
+
+    def used_media(self) -> list[str]:
+        ''' Relative paths of the videos that are cut into a timeline '''
+        media_uids = set()
+        for subclip in self.subclips():
+            video_clip = self.deref(subclip.find('Clip'))
+            if video_clip is None or video_clip.tag != 'VideoClip':
+                continue
+            source = self.deref(video_clip.find('Clip/Source'))
+            if source is not None and source.tag == 'VideoMediaSource':
+                media_uids.add(source.find('MediaSource/Media').get('ObjectURef'))
+        return self.media_paths(media_uids)
+
+def extract_included_video_paths(root:ET.Element) -> list[str]:
+    # returns all videos already imported into the project
+    return PremiereProject(root).included_media()
+
+def extract_used_video_paths(root:ET.Element) -> list[str]:
+    # returns all videos actually used in the timeline
+    return PremiereProject(root).used_media()
+
+def used_media_in_project(project_path:Path) -> list[str]:
+    # top-level so it can run in a worker process
+    project = PremiereProject.from_file(project_path)
+    return project.used_media() if project else []
+
+def place_appearances(appearances:list[dict], clip_start:float, in_point:float, out_point:float) -> list[dict]:
+    ''' Map a nested sequence's appearances into its parent for one placement, trimmed to the clip's in/out points '''
+    placed = []
+    for a in appearances:
+        if a['start_time'] >= out_point or a['end_time'] < in_point:
+            continue
+        placed.append({'actor_uuid': a['actor_uuid'],
+                       'start_time': clip_start + max(in_point, a['start_time']) - in_point,
+                       'end_time': clip_start + min(out_point, a['end_time']) - in_point})
+    return placed
+
+def round_appearances(appearances:list[dict]) -> list[dict]:
+    return [{'actor_uuid': a['actor_uuid'], 'start_time': round(a['start_time'], 2), 'end_time': round(a['end_time'], 2)}
+            for a in appearances]
+
+def get_actors_in_sequence(project:PremiereProject, sequence:ET.Element, banned_bins:list[str]|None=None,
+                           sequence_cache:dict[str, list[dict]]|None=None) -> list[dict]:
+    # same walk as adobe.premiere.get_actors_in_sequence, read from the saved project
+    # appearances are in the sequence's own time; each nested sequence is walked once and placed per use
+    sequence_cache = {} if sequence_cache is None else sequence_cache
+    actor_appearances = []
+
+    for track in project.video_tracks(sequence):
+        for track_item in project.track_items(track):
+            clip = project.timeline_clip(track_item)
+            project_item = clip['project_item']
+
+            # check if clip has visible video
+            if project_item is None or clip['disabled']:
+                continue
+
+            # check if this is automatically ruled out
+            bin_path = '\\'.join(project.bin_path(project_item)) + '\\'
+            if banned_bins and any(bin_path.startswith(f'{b}\\') for b in banned_bins):
+                continue
+
+            nested = clip['sequence']
+            if nested is not None:
+                node_id = nested.get('ObjectUID')
+                if node_id not in sequence_cache:
+                    sequence_cache[node_id] = [] # a sequence nested in itself adds nothing
+                    sequence_cache[node_id] = get_actors_in_sequence(project, nested, banned_bins, sequence_cache)
+                actor_appearances.extend(place_appearances(sequence_cache[node_id], clip['start'],
+                                                           clip['in_point'], clip['out_point']))
+
+            elif (actor_uuids := project.actor_uuids(project_item, clip['master_clip'])):
+                # actual video content with actors
+                actor_appearances.append({'actor_uuid': actor_uuids,
+                                          'start_time': clip['start'], 'end_time': clip['end']})
+
+    return actor_appearances
+
+def get_actors_in_project(project:PremiereProject, sequence_name:str, banned_bins:list[str]|None=None) -> list[dict]|None:
+    sequence = project.sequence_by_name(sequence_name)
+    if sequence is not None:
+        return round_appearances(get_actors_in_sequence(project, sequence, banned_bins=banned_bins))
+
+def get_chapter_markers(project:PremiereProject, sequence_name:str) -> list[tuple[str, float]]|None:
+    # same chapters as adobe.premiere.get_chapter_markers, read from the saved project
+    sequence = project.sequence_by_name(sequence_name)
+    if sequence is not None:
+        return [(m['name'], round(m['start'], 2)) for m in project.markers(sequence)
+                if m['type'].lower() == 'chapter']
@@ -0,0 +1,59 @@
+'''Time the Premiere side of compile.py against a fake pymiere, counting round trips as the main cost.'''
+
+from pathlib import Path
+import argparse
+from time import perf_counter
+
+from common.structure import ADOBE_BIN
+from adobe.fake_pymiere import Session, FakeApp, install, from_prproj, synthetic_library, synthetic_project
+
+def report(ui, stage:str, session:Session, elapsed:float, top:int=8):
+    ui.add_update(f'\n=== {stage} ===')
+    ui.add_update(f'{session.total:,} round trips, {elapsed:.2f} s '
+                  f'({session.latency * 1000:g} ms per round trip)')
+    for name, n in session.calls.most_common(top):
+        ui.add_update(f'{n:>10,}  {name}')
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark import_and_label and get_actors_and_chapters without Premiere.')
+    ap.add_argument('--project', type=Path, default=None, help='Saved .prproj to mirror (default: a synthetic project).')
+    ap.add_argument('--timeline', type=str, default='Main', help='Timeline to read actors and chapters from.')
+    ap.add_argument('--banned-bins', nargs='*', default=None, help='Bins whose clips are not counted as appearances.')
+    ap.add_argument('--latency', type=float, default=1.0, help='Milliseconds added to each round trip.')
+    ap.add_argument('--people', type=int, default=6, help='Person bins in the synthetic project.')
+    ap.add_argument('--videos', type=int, default=40, help='Reviewed videos per person in the synthetic project.')
+    ap.add_argument('--nested', type=int, default=4, help='Nested sequences in the synthetic project.')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    session = Session(args.latency / 1000)
+    if args.project:
+        project = from_prproj(args.project, session)
+        library = project.media_by_bin(ADOBE_BIN)
+    else:
+        library = synthetic_library(args.people, args.videos)
+        project = synthetic_project(session, library, bin_name=ADOBE_BIN, nested=args.nested, seed=args.seed)
+    install(FakeApp(session, [project]))
+
+    # these bind pymiere when imported, so they come after the fake is installed
+    from common.console import SplitConsole
+    from repositories.assemble import place_videos, read_actors_and_chapters
+
+    ui = SplitConsole()
+    label_map = {person: i % 16 for i, person in enumerate(library)}
+
+    session.reset()
+    start = perf_counter()
+    place_videos(0, list(library), library, label_map, ui, dry_run=False)
+    report(ui, 'import_and_label', session, perf_counter() - start)
+
+    session.reset()
+    start = perf_counter()
+    actor_timestamps, chapter_timestamps = read_actors_and_chapters(0, args.timeline, args.banned_bins)
+    report(ui, 'get_actors_and_chapters', session, perf_counter() - start)
+    ui.add_update(f'{len(actor_timestamps or [])} appearances, {len(chapter_timestamps or [])} chapters')
+
+    ui.set_status('Done.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+'''Results of expensive file reads, reused while the file's size and modified time are unchanged.'''
+
+import json
+from pathlib import Path
+
+CACHE_VERSION = 1
+
+class SignatureCache:
+    '''JSON file of path -> (size, mtime, value), for values derived only from the file's contents.'''
+    def __init__(self, cache_path:Path|None=None):
+        self.cache_path = cache_path
+        self.entries: dict[str, dict] = {}
+        self.changed = False
+
+        if cache_path and cache_path.exists():
+            try:
+                with open(cache_path) as f:
+                    stored = json.load(f)
+                if stored.get('version') == CACHE_VERSION:
+                    self.entries = stored['entries']
+            except (OSError, ValueError, KeyError):
+                # a broken cache only costs a re-parse
+                self.entries = {}
+
+    @staticmethod
+    def signature(file_path:Path) -> tuple[int, int]:
+        stat = file_path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def get(self, file_path:Path):
+        ''' Stored value if the file hasn't changed since, else None '''
+        entry = self.entries.get(str(file_path))
+        if entry and (entry['size'], entry['mtime_ns']) == self.signature(file_path):
+            return entry['value']
+
+    def put(self, file_path:Path, value):
+        size, mtime_ns = self.signature(file_path)
+        self.entries[str(file_path)] = {'size': size, 'mtime_ns': mtime_ns, 'value': value}
+        self.changed = True
+
+    def save(self):
+        if not (self.cache_path and self.changed):
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # write beside and swap in, so an interrupted run can't leave half a file
+        temp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f)
+        temp_path.replace(self.cache_path)
+        self.changed = False
@@ -0,0 +1,105 @@
+'''Perceptual video fingerprints to catch the same clip re-encoded at another size or resolution.'''
+
+from pathlib import Path
+from itertools import combinations
+from concurrent.futures import ThreadPoolExecutor
+
+from cv2 import (VideoCapture, CAP_PROP_FRAME_COUNT, CAP_PROP_POS_FRAMES,
+                 cvtColor, COLOR_BGR2GRAY, resize, INTER_AREA)
+
+N_FRAMES = 8 # frames sampled per clip, at fixed fractions of its length
+HASH_HEX = 16 # 64-bit difference hash per frame
+N_BANDS = 4 # 16-bit bands per frame hash for the LSH buckets
+MAX_DISTANCE = 10 # mean differing bits per frame to call two clips the same
+MAX_BUCKET = 50 # band values shared by more clips than this (e.g. black frames) say nothing
+UNREADABLE = 'unreadable' # stored for clips that couldn't be decoded, so they aren't tried again every scan
+
+def difference_hash(frame) -> int:
+    ''' 64-bit dHash: is each pixel brighter than its right neighbour on a 9x8 grayscale thumbnail '''
+    small = resize(cvtColor(frame, COLOR_BGR2GRAY), (9, 8), interpolation=INTER_AREA)
+    bits = 0
+    for brighter in (small[:, :-1] > small[:, 1:]).flatten():
+        bits = (bits << 1) | int(brighter)
+    return bits
+
+def video_fingerprint(file_path:Path, n_frames:int=N_FRAMES) -> str|None:
+    ''' Frame hashes sampled evenly through the clip, as one hex string '''
+    v = VideoCapture(str(file_path))
+    frame_count = v.get(CAP_PROP_FRAME_COUNT) if v.isOpened() else 0
+
+    hashes = []
+    if frame_count >= n_frames:
+        for i in range(n_frames):
+            # middle of each slice, so fades at the very start and end are skipped
+            v.set(CAP_PROP_POS_FRAMES, int((i + 0.5) * frame_count / n_frames))
+            ok, frame = v.read()
+            if not ok:
+                break
+            hashes.append(f'{difference_hash(frame):0{HASH_HEX}x}')
+
+    v.release()
+
+    if len(hashes) == n_frames:
+        return ''.join(hashes)
+
+def video_fingerprints(file_paths:list[Path], workers:int=4) -> list[str]:
+    ''' Fingerprint clips in parallel (cv2 decodes outside the GIL), UNREADABLE for those that fail '''
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [fingerprint or UNREADABLE for fingerprint in pool.map(video_fingerprint, file_paths)]
+
+def split_fingerprint(fingerprint:str) -> list[int]:
+    return [int(fingerprint[i:i+HASH_HEX], 16) for i in range(0, len(fingerprint), HASH_HEX)]
+
+def fingerprint_distance(frames_1:list[int], frames_2:list[int]) -> float:
+    ''' Mean number of differing bits per sampled frame '''
+    return sum((a ^ b).bit_count() for a, b in zip(frames_1, frames_2)) / len(frames_1)
+
+class FingerprintIndex:
+    '''
+    Locality-sensitive index over fingerprints: each frame hash is split into bands and
+    clips are only compared when they share a band value at the same frame position.
+    '''
+    def __init__(self):
+        self.frames: dict[object, list[int]] = {}
+        self.buckets: dict[tuple[int, int, int], list[object]] = {}
+
+    def _band_keys(self, frames:list[int]):
+        band_bits = 64 // N_BANDS
+        mask = (1 << band_bits) - 1
+        for i, frame in enumerate(frames):
+            for b in range(N_BANDS):
+                yield (i, b, (frame >> (b * band_bits)) & mask)
+
+    def add(self, key, fingerprint:str):
+        frames = split_fingerprint(fingerprint)
+        self.frames[key] = frames
+        for band_key in self._band_keys(frames):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def find(self, fingerprint:str, max_distance:float=MAX_DISTANCE) -> list[tuple[object, float]]:
+        ''' Indexed clips that look like this fingerprint '''
+        frames = split_fingerprint(fingerprint)
+        found = set()
+        for band_key in self._band_keys(frames):
+            keys = self.buckets.get(band_key, [])
+            if len(keys) <= MAX_BUCKET:
+                found.update(keys)
+
+        matches = [(key, round(distance, 1)) for key in found
+                   if (distance := fingerprint_distance(frames, self.frames[key])) <= max_distance]
+        return sorted(matches, key=lambda x: x[1])
+
+    def near_duplicates(self, max_distance:float=MAX_DISTANCE) -> list[tuple[object, object, float]]:
+        ''' Pairs of keys whose clips look the same, checked only within shared buckets '''
+        pairs = set()
+        for keys in self.buckets.values():
+            if 1 < len(keys) <= MAX_BUCKET:
+                pairs.update(combinations(sorted(keys, key=str), 2))
+
+        matches = []
+        for key_1, key_2 in pairs:
+            distance = fingerprint_distance(self.frames[key_1], self.frames[key_2])
+            if distance <= max_distance:
+                matches.append((key_1, key_2, round(distance, 1)))
+
+        return sorted(matches, key=lambda x: x[2])
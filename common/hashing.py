@@ -0,0 +1,53 @@
+'''Content hashes for spotting exact duplicate videos regardless of name or location.'''
+
+from pathlib import Path
+from hashlib import blake2b
+
+SAMPLE_SIZE = 1024**2 # 1 MB from the start, middle and end of each file
+FULL_HASH_LIMIT = 3 * SAMPLE_SIZE # smaller files are hashed whole
+
+def content_hash(file_path:Path) -> str:
+    '''
+    Hash of the file size plus sampled chunks, so multi-GB clips cost three small reads.
+    Re-encodes won't match, but byte-for-byte copies under any name will.
+    '''
+    size = file_path.stat().st_size
+    digest = blake2b(str(size).encode(), digest_size=16)
+
+    with open(file_path, 'rb') as f:
+        if size <= FULL_HASH_LIMIT:
+            digest.update(f.read())
+        else:
+            for offset in (0, (size - SAMPLE_SIZE) // 2, size - SAMPLE_SIZE):
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_SIZE))
+
+    return digest.hexdigest()
+
+class HashIndex:
+    '''Content hash -> paths already in the library, for O(1) duplicate checks.'''
+    def __init__(self):
+        self.paths: dict[str, list[Path]] = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, file_hash:str):
+        return file_hash in self.paths
+
+    def add(self, file_path:Path, file_hash:str|None=None) -> str:
+        file_hash = file_hash or content_hash(file_path)
+        known = self.paths.setdefault(file_hash, [])
+        if file_path not in known:
+            known.append(file_path)
+        return file_hash
+
+    def find(self, file_hash:str, exclude:Path|None=None) -> Path|None:
+        ''' Another library path with this hash, if any '''
+        for p in self.paths.get(file_hash, []):
+            if p != exclude:
+                return p
+
+    def match(self, file_path:Path) -> Path|None:
+        ''' Hash a file and return an existing copy of it, if any '''
+        return self.find(content_hash(file_path), exclude=file_path)
@@ -0,0 +1,69 @@
+'''Download OneDrive placeholders ahead of a review pass, so nothing is skipped as cloud-only.'''
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common.system import check_file_availability, get_videos_in_folder, get_premiere_projects_in_folder
+from common.transfer import Bandwidth, CHUNK_SIZE, REFRESH
+
+PLACEHOLDER_STATES = ['cloud_placeholder', 'dehydrated_placeholder']
+
+def find_placeholders(folders:list[Path], project_folder:Path|None=None) -> list[Path]:
+    ''' Cloud-only Premiere projects first (small, and needed to mark used media), then videos smallest first '''
+    projects = get_premiere_projects_in_folder(project_folder) if project_folder and project_folder.exists() else []
+    videos = [v for f in folders if f.exists() for v in get_videos_in_folder(f, recursive=True)]
+
+    placeholders = [p for p in projects if check_file_availability(p) in PLACEHOLDER_STATES]
+    placeholders += sorted((v for v in videos if check_file_availability(v) in PLACEHOLDER_STATES),
+                           key=lambda x: x.stat().st_size)
+    return placeholders
+
+def hydrate_file(file_path:Path, counter:Bandwidth) -> int:
+    # reading every byte makes the sync client recall the whole file
+    size = 0
+    with open(file_path, 'rb') as f:
+        while (chunk := f.read(CHUNK_SIZE)):
+            size += len(chunk)
+            counter.consume(len(chunk))
+    return size
+
+def hydrate_files(file_paths:list[Path], workers:int=4, max_bytes:int|None=None,
+                  progress=None) -> tuple[list[Path], list[tuple[Path, Exception]], list[Path]]:
+    '''
+    Hydrate placeholders on a bounded pool, in the order given, until max_bytes have been queued.
+    progress(files_done, files_total, bytes_done, bytes_total) is called from the calling thread.
+    Returns the files hydrated, the ones that failed and the ones left over the budget.
+    '''
+    queued = []
+    skipped = []
+    bytes_total = 0
+    for p in file_paths:
+        size = p.stat().st_size
+        if max_bytes is not None and bytes_total + size > max_bytes:
+            skipped.append(p)
+        else:
+            queued.append(p)
+            bytes_total += size
+
+    hydrated = []
+    failed = []
+    if not queued:
+        return hydrated, failed, skipped
+
+    counter = Bandwidth()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(hydrate_file, p, counter): p for p in queued}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=REFRESH, return_when=FIRST_COMPLETED)
+            for future in finished:
+                try:
+                    future.result()
+                    hydrated.append(futures[future])
+                except OSError as e:
+                    failed.append((futures[future], e))
+
+            if progress:
+                progress(len(hydrated) + len(failed), len(queued), counter.transferred, bytes_total)
+
+    return hydrated, failed, skipped
@@ -0,0 +1,79 @@
+'''Plan of file and database changes recorded by a dry run, so it can be applied without rescanning.'''
+
+import json
+from io import StringIO
+from pathlib import Path
+from datetime import datetime
+
+from pandas import DataFrame, read_json
+
+PLAN_VERSION = 1
+
+# steps recorded this run, None when not planning
+_plan: list[dict]|None = None
+
+def start_plan():
+    global _plan
+    _plan = []
+
+def is_planning() -> bool:
+    return _plan is not None
+
+def stamp(path:Path) -> int|None:
+    ''' Modified time of a path, or None if it doesn't exist '''
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+def stamp_paths(paths:list[Path]) -> dict[str, int|None]:
+    return {str(p): stamp(p) for p in dict.fromkeys(paths)}
+
+def record_step(step:dict):
+    if _plan is not None:
+        _plan.append(step)
+
+def record_copies(jobs:list[tuple[Path, Path]]):
+    # the source must be unchanged and the destination still free
+    for source, destination in jobs:
+        record_step({'action': 'copy', 'source': str(source), 'destination': str(destination),
+                     'stamps': stamp_paths([source, destination])})
+
+def record_move(source:Path, destination:Path):
+    record_step({'action': 'move', 'source': str(source), 'destination': str(destination),
+                 'stamps': stamp_paths([source, destination])})
+
+def record_db(operation:str, df:DataFrame, depends_on:list[Path]|None=None):
+    ''' A db_project write, with the paths whose state it was built from '''
+    record_step({'action': 'db', 'operation': operation,
+                 'data': df.to_json(orient='split', index=False, date_format='iso', default_handler=str),
+                 'stamps': stamp_paths(depends_on or [])})
+
+def save_plan(path:Path|str):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'version': PLAN_VERSION, 'created': datetime.now().isoformat(timespec='seconds'),
+                   'steps': _plan or []}, f, indent=1)
+
+def load_plan(path:Path|str) -> list[dict]:
+    with open(path) as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f'Plan {path} was written by a different version ({plan.get("version")})')
+    return plan['steps']
+
+def stale_steps(steps:list[dict]) -> list[tuple[int, str]]:
+    ''' Steps whose paths changed since planning (one stat per path) '''
+    stale = []
+    for i, step in enumerate(steps):
+        for path, mtime in step['stamps'].items():
+            if stamp(Path(path)) != mtime:
+                stale.append((i, path))
+                break
+    return stale
+
+def step_frame(step:dict) -> DataFrame:
+    ''' Rows of a db step, with nulls as None for the driver '''
+    df = read_json(StringIO(step['data']), orient='split', dtype=False, convert_dates=False)
+    return df.astype(object).where(df.notnull(), None)
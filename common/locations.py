@@ -80,6 +80,10 @@ def detect_onedrive_base() -> Path | None:
                 cloud_root / "OneDrive"  # rare legacy
             ])
 
+        case 'linux':
+            # no official client; onedriver/rclone mounts usually sit in home
+            return _first_existing([os.environ.get("ONEDRIVE_ROOT"), home / "OneDrive"])
+
 # ---------- Google Drive
 
 def detect_gdrive_base() -> Path | None:
@@ -157,6 +161,10 @@ def detect_gdrive_base() -> Path | None:
                 cloud_root / "GoogleDrive",
             ])
 
+        case 'linux':
+            return _first_existing([os.environ.get("GDRIVE_ROOT"), home / "GoogleDrive" / "My Drive",
+                                    home / "GoogleDrive"])
+
 def _safe_children(p: Path):
     try:
         return [c for c in p.iterdir() if c.is_dir()]
@@ -197,7 +205,10 @@ def list_versioned_dirs(base: Path, prefix: str):
 
 def detect_app_path(apps_details, app_name):
     app_path = None
-    app_details = apps_details[system][app_name]
+    app_details = apps_details.get(system, {}).get(app_name)
+    if not app_details:
+        # not installable on this system (e.g. Premiere on Linux)
+        return None
     match system:
         case 'windows':
             drive, _ = os.path.splitdrive(os.getcwd())
@@ -232,6 +243,9 @@ def get_browser_data(browser_details):
             return Path.home() / 'AppData' / 'Local'/ browser_details / 'User Data'
         case 'macos':
             return Path.home() / 'Library' / 'Application Support' / browser_details
+        case 'linux':
+            # Google/Chrome -> ~/.config/google-chrome
+            return Path.home() / '.config' / browser_details.lower().replace('/', '-')
 
 def detect_external_drive(volume_label: str) -> Path | None:
     """
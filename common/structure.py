@@ -5,7 +5,7 @@ import json
 import tomllib
 
 from common.locations import (detect_gdrive_base, detect_onedrive_base, detect_app_path, 
-                              detect_external_drive, get_browser_data)
+                              detect_external_drive, get_browser_data, system)
 
 _auths_folder = 'auths'
 _config_folder = 'config'
@@ -63,8 +63,17 @@ CHROME_STATE = read_json(CHROME_DATA, 'Local State', '')
 EDGE_STATE = read_json(EDGE_DATA, 'Local State', '')
 
 # LOCATIONS
-one_drive_base = detect_onedrive_base()
-google_drive_base = detect_gdrive_base()
+def require_drive(base:Path|None, name:str, fallback:Path) -> Path:
+    # Linux has no sync clients, so it only runs offline tools and benchmarks against a placeholder;
+    # elsewhere a missing drive would make every library folder look deleted
+    if base:
+        return base
+    if system == 'linux':
+        return fallback
+    raise FileNotFoundError(f'{name} folder not found, check that it is installed and signed in')
+
+one_drive_base = require_drive(detect_onedrive_base(), 'OneDrive', Path.home() / 'OneDrive')
+google_drive_base = require_drive(detect_gdrive_base(), 'Google Drive', Path.home() / 'GoogleDrive')
 
 ONE_DRIVE_ROOT = one_drive_base
 ONE_DRIVE_FOLDER = one_drive_base / _drives['local_storage']['onedrive']['videos']
@@ -84,6 +93,26 @@ LABEL_PRESET = _drives['local_storage']['adobe']['label_preset']
 ADOBE_BIN = _drives['local_storage']['adobe']['bin']
 
 
+# DATABASE
+DB_BACKEND = _config['database']['backend']
+DB_EMBEDDED_PATH = _config['database']['embedded_path']
+
+# CACHES
+CACHE_FOLDER = Path(_config['cache']['folder'])
+
+# TRANSFERS
+COPY_WORKERS = _config['transfer']['workers']
+COPY_BANDWIDTH = int(_config['transfer']['bandwidth_mbps'] * 1e6 / 8) or None # bytes per second
+
+# HARVESTING
+HARVEST_WORKERS = _config['harvest']['workers']
+HARVEST_DOWNLOADS = _config['harvest']['downloads']
+HARVEST_BANDWIDTH = int(_config['harvest']['bandwidth_mbps'] * 1e6 / 8) or None # bytes per second
+
+# HYDRATION
+HYDRATE_WORKERS = _config['hydrate']['workers']
+HYDRATE_BUDGET = int(_config['hydrate']['max_gb'] * 1024**3) or None # bytes
+
 # APIS
 AZURE_LOGIN_URL = _api['azure']['urls']['login']
 AZURE_GRAPH_URL = _api['azure']['urls']['graph']
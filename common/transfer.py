@@ -0,0 +1,200 @@
+'''Copy engine for large video files: parallel, resumable and atomic.'''
+
+import os
+import errno
+import shutil
+import threading
+import ctypes
+from pathlib import Path
+from time import monotonic, sleep
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from common.locations import detect_system
+
+system_name = detect_system()
+if system_name == 'linux':
+    import fcntl
+
+PARTIAL_EXT = '.partial'
+CHUNK_SIZE = 8 * 1024**2 # 8 MB
+REFRESH = 1 # seconds between progress updates
+
+FICLONE = 0x40049409 # Linux ioctl for a copy-on-write clone (Btrfs, XFS)
+ERROR_NOT_SAME_DEVICE = 17 # Windows error when renaming across volumes
+
+class Bandwidth:
+    '''Byte counter shared by copy workers, with an optional cap in bytes per second.'''
+    def __init__(self, bytes_per_second:int|None=None):
+        self.rate = bytes_per_second
+        self.transferred = 0
+        self._lock = threading.Lock()
+        self._next_slot = monotonic()
+
+    def consume(self, n_bytes:int):
+        with self._lock:
+            self.transferred += n_bytes
+            if not self.rate:
+                return
+            # reserve the next slot on a shared timeline so all workers together stay under the cap
+            now = monotonic()
+            self._next_slot = max(now, self._next_slot) + n_bytes / self.rate
+            delay = self._next_slot - now
+
+        if delay > 0:
+            sleep(delay)
+
+def partial_path(destination:Path) -> Path:
+    return destination.with_name(destination.name + PARTIAL_EXT)
+
+# ---------- Zero-copy helpers
+
+def clone_file(source:Path, destination:Path, allow_os_copy:bool=True) -> bool:
+    '''
+    Let the filesystem or OS do the whole copy without passing bytes through Python.
+    Reflink / clonefile are metadata-only on the same volume; CopyFileW does a kernel copy
+    (and block clones on ReFS). Returns False if nothing applied, so the caller can stream it.
+    '''
+    try:
+        match system_name:
+            case 'linux':
+                with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                    fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return True
+
+            case 'macos':
+                libc = ctypes.CDLL('libc.dylib', use_errno=True)
+                if destination.exists():
+                    destination.unlink()
+                return libc.clonefile(os.fsencode(source), os.fsencode(destination), 0) == 0
+
+            case 'windows':
+                if allow_os_copy:
+                    return bool(ctypes.windll.kernel32.CopyFileW(str(source), str(destination), False))
+
+    except (OSError, AttributeError):
+        pass
+
+    return False
+
+def copy_range(src, dst, offset:int, count:int, bandwidth:Bandwidth|None=None):
+    '''
+    Copy count bytes starting at offset between open files, in the kernel where possible
+    (copy_file_range, then sendfile), falling back to a streamed read/write.
+    '''
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    end = offset + count
+    kernel_copy = getattr(os, 'copy_file_range', None)
+    send_file = getattr(os, 'sendfile', None) if system_name == 'linux' else None
+
+    while offset < end:
+        n = min(CHUNK_SIZE, end - offset)
+        sent = 0
+        if kernel_copy:
+            try:
+                sent = kernel_copy(src_fd, dst_fd, n, offset, offset)
+            except OSError:
+                kernel_copy = None
+        if not sent and send_file:
+            try:
+                os.lseek(dst_fd, offset, os.SEEK_SET)
+                sent = send_file(dst_fd, src_fd, offset, n)
+            except OSError:
+                send_file = None
+        if not sent:
+            src.seek(offset)
+            dst.seek(offset)
+            chunk = src.read(n)
+            if not chunk:
+                break
+            dst.write(chunk)
+            sent = len(chunk)
+
+        offset += sent
+        if bandwidth:
+            bandwidth.consume(sent)
+
+def move_file(source:Path, destination:Path, bandwidth:Bandwidth|None=None):
+    ''' Rename when on the same volume, otherwise copy (zero-copy where possible) and remove the source '''
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        source.rename(destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV and getattr(e, 'winerror', None) != ERROR_NOT_SAME_DEVICE:
+            raise
+        copy_file(source, destination, bandwidth)
+        source.unlink()
+
+def copy_file(source:Path, destination:Path, bandwidth:Bandwidth|None=None) -> int:
+    '''
+    Copy into a .partial file beside the destination and rename it into place when complete.
+    A leftover .partial from an interrupted run is resumed if the source hasn't changed since.
+    Returns the number of bytes copied.
+    '''
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    partial = partial_path(destination)
+
+    source_stat = source.stat()
+    done = 0
+    if partial.exists():
+        partial_stat = partial.stat()
+        if partial_stat.st_size <= source_stat.st_size and partial_stat.st_mtime >= source_stat.st_mtime:
+            done = partial_stat.st_size
+        else:
+            partial.unlink()
+
+    # whole-file clone first (an OS copy would bypass the bandwidth cap, so only without one)
+    cloned = not done and clone_file(source, partial, allow_os_copy=not (bandwidth and bandwidth.rate))
+    if cloned:
+        if bandwidth:
+            bandwidth.consume(source_stat.st_size)
+    else:
+        with open(source, 'rb') as src, open(partial, 'r+b' if done else 'wb') as dst:
+            copy_range(src, dst, done, source_stat.st_size - done, bandwidth)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+    shutil.copystat(source, partial)
+    os.replace(partial, destination)
+
+    return source_stat.st_size - done
+
+def file_size(path:Path) -> int:
+    ''' Size in bytes, or 0 for a file that can't be read (yet) '''
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+def copy_files(jobs:list[tuple[Path, Path]], workers:int=4, bytes_per_second:int|None=None,
+               progress=None) -> tuple[list[Path], list[tuple[Path, Exception]]]:
+    '''
+    Copy (source, destination) pairs on a bounded worker pool.
+    progress(files_done, files_total, bytes_done, bytes_total) is called from the calling thread.
+    Returns the destinations copied and the sources that failed.
+    '''
+    copied = []
+    failed = []
+    if not jobs:
+        return copied, failed
+
+    bandwidth = Bandwidth(bytes_per_second)
+    # a source gone since it was listed fails in its worker, with the rest of the errors
+    bytes_total = sum(file_size(s) for s, _ in jobs)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(copy_file, s, d, bandwidth): (s, d) for s, d in jobs}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=REFRESH, return_when=FIRST_COMPLETED)
+            for future in finished:
+                source, destination = futures[future]
+                try:
+                    future.result()
+                    copied.append(destination)
+                except OSError as e:
+                    failed.append((source, e))
+
+            if progress:
+                progress(len(copied) + len(failed), len(jobs), bandwidth.transferred, bytes_total)
+
+    return copied, failed
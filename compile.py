@@ -6,11 +6,13 @@ import sys
 from datetime import datetime
 
 from common.structure import ONE_DRIVE_FOLDER, ADOBE_FOLDER
+from common.structure import DB_BACKEND, DB_EMBEDDED_PATH
 from common.structure import YIR_REVIEWS, PR_EXT, COMMON_FOLDER, LABEL_PRESET ## needed for pymiere control
 from common.secret import secrets
 from common.console import SplitConsole
-from database.db import get_engine
-from repositories.assemble import ensure_premiere, import_and_label, setup_label_presets, get_actors_and_chapters
+from database.db import get_engine, report_queries
+from repositories.assemble import (ensure_premiere, import_and_label, setup_label_presets, get_actors_and_chapters,
+                                  get_project_path, read_project_file, get_actors_offline, get_chapters_offline)
 
 PGSECRETS = secrets['postgresql']['host']
 PGHOST = secrets['postgresql']['host']
@@ -24,7 +26,25 @@ MIN_STARS = 3
 ui = SplitConsole()
 
 def set_up_engine():
-    return get_engine(PGHOST, PGPORT, PGDBNAME, PGUSER, PGPASSWORD)
+    return get_engine(PGHOST, PGPORT, PGDBNAME, PGUSER, PGPASSWORD,
+                      backend=DB_BACKEND, embedded_path=DB_EMBEDDED_PATH)
+
+def update_project_offline(year:int, pull:bool, label:bool, appear:bool):
+    # work from the saved project file, without Premiere
+    engine = set_up_engine()
+
+    if pull:
+        ui.add_update('Importing videos needs Premiere running, skipped with --offline.')
+    if label:
+        setup_label_presets(engine, COMMON_FOLDER, LABEL_PRESET)
+    if appear:
+        project_path = get_project_path(engine, year, ADOBE_FOLDER, YIR_REVIEWS, PR_EXT)
+        project = read_project_file(project_path, ui) if project_path else None
+        if project:
+            get_actors_offline(engine, project, year, ui)
+            get_chapters_offline(engine, project, year, ui)
+
+    engine.dispose()
 
 def update_project(year:int, pull:bool, label:bool, appear:bool, min_stars:int, dry_run=True):
     engine = set_up_engine()
@@ -53,19 +73,27 @@ def main():
     ap.add_argument('--stars', type=int, default=MIN_STARS, help='Minimum star rating to use in project.')
     ap.add_argument('--appear', nargs='?', type=bool, const=True, default=False, help='Update the appearances table.')
     ap.add_argument('--label', nargs='?', type=bool, const=True, default=False, help='Update the appearances table.')
+    ap.add_argument('--offline', nargs='?', type=bool, const=True, default=False, help='Read the saved project file instead of using Premiere.')
 
     group = ap.add_mutually_exclusive_group()
     group.add_argument("--apply", action="store_true", help="Actually copy files.")
     group.add_argument("--dry-run", action="store_true", help="Do not copy or download; show what would happen.")
     
+    ap.add_argument('--query-log', type=str, default=None, help='Write per-query timings to this JSON file.')
+
     args = ap.parse_args()
     dry_run = not args.apply  # default to dry-run unless --apply
 
     ui.add_update(f'Running with args: {args}')
 
-    if sys.version_info >= (3, 12):
-        print('WARNING! Pymiere was built for older versions of Python and may not work properly.')
-    update_project(args.year, args.pull, args.label, args.appear, args.stars, dry_run=dry_run)
+    if args.offline:
+        update_project_offline(args.year, args.pull, args.label, args.appear)
+    else:
+        if sys.version_info >= (3, 12):
+            print('WARNING! Pymiere was built for older versions of Python and may not work properly.')
+        update_project(args.year, args.pull, args.label, args.appear, args.stars, dry_run=dry_run)
+
+    report_queries(ui, args.query_log)
 
     ui.set_status("Done.")
 
@@ -1,8 +1,25 @@
+import sys
+import json
+from pathlib import Path
+from time import perf_counter
+
 from sqlalchemy import create_engine, text, Engine
 from pandas import read_sql_query, DataFrame
 
-def get_engine(host:str, port:str, dbname:str, user:str, password:str):
-    engine = create_engine(f'postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}')
+from database.db_embedded import to_blank_keys, from_blank_keys
+
+# per-run query instrumentation
+_query_log: list[dict] = []
+
+def get_engine(host:str, port:str, dbname:str, user:str, password:str,
+               backend:str='postgresql', embedded_path:Path|str|None=None):
+    match backend:
+        case 'duckdb':
+            # local store for offline runs and benchmarks
+            from database.db_embedded import get_embedded_engine
+            engine = get_embedded_engine(embedded_path)
+        case _:
+            engine = create_engine(f'postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}')
     return engine
 
 def build_values(df: DataFrame, cols:list[str]) -> tuple[str, dict[str, object]]:
@@ -14,27 +31,61 @@ def build_values(df: DataFrame, cols:list[str]) -> tuple[str, dict[str, object]]
         append_string = ', '.join(f':{c}_{idx}' for c in cols)
         value_clauses.append(f'({append_string})')
         for c in cols:
-            params[f'{c}_{idx}'] = row[f'{c}']
+            # plain python values so every driver can bind them (numpy scalars -> int/float)
+            value = row[f'{c}']
+            params[f'{c}_{idx}'] = value.item() if hasattr(value, 'item') else value
         
     values = ', '.join(value_clauses)
 
     return values, params
 
-def read_sql(engine:Engine, sql:str) -> DataFrame:
+def _statement_name(name:str|None) -> str:
+    # default to the db_* function that issued the statement
+    return name or sys._getframe(2).f_code.co_name
+
+def _params_size(rows:list[dict]|dict|None) -> int:
+    # rough size of the bound parameters as text, not bytes on the wire
+    if not rows:
+        return 0
+    if isinstance(rows, dict):
+        rows = [rows]
+    return sum(len(str(v)) for row in rows for v in row.values())
+
+def record_query(name:str, seconds:float, rows:int, size:int):
+    _query_log.append({'statement': name, 'seconds': seconds, 'rows': rows, 'approx_bytes': size})
+
+def _is_embedded(engine:Engine) -> bool:
+    return engine.dialect.name == 'duckdb'
+
+def read_sql(engine:Engine, sql:str, name:str|None=None) -> DataFrame:
+    name = _statement_name(name)
+    start = perf_counter()
     with engine.begin() as conn:
         df = read_sql_query(text(sql), conn)
+    if _is_embedded(engine):
+        df = from_blank_keys(df)
+
+    record_query(name, perf_counter() - start, len(df), int(df.memory_usage(deep=True).sum()))
 
     return df
 
 def execute_sql(engine:Engine, sql:str, params:dict|None=None,
-                df:DataFrame|None=None, returning:bool=False):
+                df:DataFrame|None=None, returning:bool=False, name:str|None=None):
+    name = _statement_name(name)
+    start = perf_counter()
+    sent = None
+
     if isinstance(params, dict):
+        sent = to_blank_keys([params])[0] if _is_embedded(engine) else params
         with engine.begin() as conn:
-            result = conn.execute(text(sql), params or {})
+            result = conn.execute(text(sql), sent or {})
 
     elif isinstance(df, DataFrame):
         if not df.empty:
             rows = df.to_dict(orient="records")
+            if _is_embedded(engine):
+                rows = to_blank_keys(rows)
+            sent = rows
             with engine.begin() as conn:
                 result = conn.execute(text(sql), rows)
         else:
@@ -44,5 +95,51 @@ def execute_sql(engine:Engine, sql:str, params:dict|None=None,
         with engine.begin() as conn:
             result = conn.execute(text(sql))
 
+    fetched = result.fetchall() if (returning and result) else None
+
+    # DuckDB doesn't report affected rows (rowcount is always -1), so those are logged as unknown
+    affected = (result.rowcount if result.rowcount >= 0 else None) if result is not None else 0
+    size = _params_size(sent) + (sum(len(str(r)) for r in fetched) if fetched else 0)
+    record_query(name, perf_counter() - start, len(fetched) if fetched else affected, size)
+
     if returning and result:
-        return result.fetchall()
\ No newline at end of file
+        return fetched
+
+def summarize_queries() -> DataFrame:
+    ''' Aggregate this run's statements, slowest first '''
+    # approx_bytes is the in-memory size of the rows read or the parameters sent, not network traffic
+    columns = ['statement', 'calls', 'total_s', 'mean_s', 'max_s', 'rows', 'approx_bytes']
+    if not _query_log:
+        return DataFrame(columns=columns)
+
+    log_df = DataFrame(_query_log)
+    summary = (log_df.groupby('statement')
+               .agg(calls=('seconds', 'size'), total_s=('seconds', 'sum'), mean_s=('seconds', 'mean'),
+                    max_s=('seconds', 'max'), rows=('rows', lambda r: r.sum(min_count=1)),
+                    approx_bytes=('approx_bytes', 'sum'))
+               .reset_index()
+               .sort_values('total_s', ascending=False))
+    summary[['total_s', 'mean_s', 'max_s']] = summary[['total_s', 'mean_s', 'max_s']].round(3)
+
+    return summary[columns]
+
+def export_queries(path:Path|str):
+    ''' Dump the summary and every recorded statement to JSON '''
+    summary = summarize_queries()
+    # unknown row counts are NaN in the summary, which isn't valid JSON
+    summary = summary.astype(object).where(summary.notna(), None)
+    with open(path, 'w') as f:
+        json.dump({'summary': summary.to_dict(orient='records'),
+                   'statements': _query_log}, f, indent=2, allow_nan=False)
+
+def report_queries(ui, query_log:Path|str|None=None):
+    ''' Show the summary on the console, and dump the full log if asked '''
+    summary = summarize_queries()
+    if not summary.empty:
+        ui.add_update('\n=== Query Summary ===')
+        for line in summary.to_string(index=False).splitlines():
+            ui.add_update(line)
+
+    if query_log:
+        export_queries(query_log)
+        ui.add_update(f'Query log written to {query_log}')
@@ -22,12 +22,14 @@ def fetch_color_labels(engine:Engine) -> DataFrame:
     ;'''
     return read_sql(engine, sql)
 
-def update_appearances(engine:Engine, df:DataFrame):
-    project_year = df['project_year'].iloc[0]
+def update_appearances(engine:Engine, project_year:int, df:DataFrame):
+    # replaces the year's rows, so an empty df clears them
     sql = f'''
     DELETE FROM project.appearances WHERE project_year = {project_year}
     ;'''
     execute_sql(engine, sql)
+    if df.empty:
+        return
 
     val_cols = ['project_year', 'member_id', 'start_time', 'end_time']
     val_ins = ', '.join(val_cols)
@@ -37,12 +39,14 @@ def update_appearances(engine:Engine, df:DataFrame):
     ;'''
     execute_sql(engine, sql, params=params)
 
-def update_chapters(engine:Engine, df:DataFrame):
-    project_year = df['project_year'].iloc[0]
+def update_chapters(engine:Engine, project_year:int, df:DataFrame):
+    # replaces the year's rows, so an empty df clears them
     sql = f'''
     DELETE FROM project.chapters WHERE project_year = {project_year}
     ;'''
     execute_sql(engine, sql)
+    if df.empty:
+        return
 
     val_cols = ['project_year', 'chapter_name', 'start_time']
     val_ins = ', '.join(val_cols)
@@ -0,0 +1,218 @@
+''' Embedded DuckDB stand-in for the Postgres database, for offline runs and benchmarks '''
+
+from pathlib import Path
+
+from sqlalchemy import create_engine, text, Engine
+from sqlalchemy.pool import StaticPool
+from pandas import DataFrame
+
+# DuckDB understands the Postgres dialect used in db_*.py (schemas, ::casts, ON CONFLICT,
+# IS NOT DISTINCT FROM), so the same statements run against both backends.
+# It has no NULLS NOT DISTINCT though, so ON CONFLICT would never match a root-level folder or a file
+# without a subfolder. Here those key columns hold '' instead of NULL, swapped at the edges by
+# read_sql and execute_sql, so callers see the same values from both backends.
+BLANK_KEYS = ['folder_name', 'subfolder_name']
+
+_SCHEMAS = ['config', 'project', 'tree', 'ingestion', 'nello']
+
+_TABLES = [
+    # config
+    '''CREATE TABLE IF NOT EXISTS config.media (
+        medium_id INTEGER PRIMARY KEY,
+        media_type VARCHAR NOT NULL UNIQUE,
+        supfolder_name VARCHAR NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS config.color_palette (
+        color_name VARCHAR PRIMARY KEY,
+        color_hex VARCHAR NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS config.adobe_labels (
+        label_id INTEGER PRIMARY KEY,
+        label_name VARCHAR NOT NULL,
+        color_name VARCHAR
+    )''',
+    '''CREATE TABLE IF NOT EXISTS config.member_labels (
+        member_id UUID PRIMARY KEY,
+        label_id INTEGER
+    )''',
+    '''CREATE TABLE IF NOT EXISTS config.compilations (
+        project_year INTEGER PRIMARY KEY,
+        file_name VARCHAR,
+        timeline_name VARCHAR,
+        banned_bins VARCHAR[]
+    )''',
+    '''CREATE TABLE IF NOT EXISTS config.enum_definitions (
+        schema_name VARCHAR,
+        enum_name VARCHAR,
+        ranked_order VARCHAR[]
+    )''',
+
+    # project
+    'CREATE SEQUENCE IF NOT EXISTS project.folder_ids',
+    '''CREATE TABLE IF NOT EXISTS project.folders (
+        folder_id INTEGER PRIMARY KEY DEFAULT nextval('project.folder_ids'),
+        folder_name VARCHAR NOT NULL DEFAULT '',
+        project_year INTEGER NOT NULL,
+        media_type VARCHAR NOT NULL,
+        member_id UUID,
+        UNIQUE (folder_name, project_year, media_type)
+    )''',
+    'CREATE SEQUENCE IF NOT EXISTS project.file_ids',
+    '''CREATE TABLE IF NOT EXISTS project.files (
+        file_id INTEGER PRIMARY KEY DEFAULT nextval('project.file_ids'),
+        folder_id INTEGER NOT NULL,
+        subfolder_name VARCHAR NOT NULL DEFAULT '',
+        file_name VARCHAR NOT NULL,
+        file_size DOUBLE,
+        video_date TIMESTAMP,
+        video_duration INTEGER,
+        video_resolution VARCHAR,
+        video_rating INTEGER,
+        used_status BOOLEAN,
+        content_hash VARCHAR,
+        video_fingerprint VARCHAR,
+        file_bytes BIGINT,
+        file_mtime_ns BIGINT,
+        UNIQUE (folder_id, subfolder_name, file_name)
+    )''',
+    'CREATE INDEX IF NOT EXISTS files_content_hash_idx ON project.files (content_hash)',
+    '''CREATE TABLE IF NOT EXISTS project.appearances (
+        project_year INTEGER NOT NULL,
+        member_id UUID NOT NULL,
+        start_time DOUBLE NOT NULL,
+        end_time DOUBLE NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS project.chapters (
+        project_year INTEGER NOT NULL,
+        chapter_name VARCHAR,
+        start_time DOUBLE NOT NULL
+    )''',
+
+    # ingestion
+    '''CREATE TABLE IF NOT EXISTS ingestion.shared_album_details (
+        album_id INTEGER PRIMARY KEY,
+        share_url VARCHAR NOT NULL,
+        folder_name VARCHAR,
+        project_year INTEGER,
+        supfolder_name VARCHAR,
+        scrape_name VARCHAR,
+        browser_name VARCHAR,
+        profile_name VARCHAR,
+        notes VARCHAR
+    )''',
+    '''CREATE TABLE IF NOT EXISTS ingestion.album_manifests (
+        album_id INTEGER PRIMARY KEY,
+        item_count INTEGER NOT NULL,
+        item_ids VARCHAR,
+        harvested_at TIMESTAMP
+    )''',
+
+    # family tree
+    '''CREATE TABLE IF NOT EXISTS persons (
+        person_id UUID PRIMARY KEY,
+        first_name VARCHAR, last_name VARCHAR, nick_name VARCHAR, suffix VARCHAR,
+        birth_date DATE, birth_date_precision VARCHAR
+    )''',
+    '''CREATE TABLE IF NOT EXISTS animals (
+        animal_id UUID PRIMARY KEY,
+        first_name VARCHAR, nick_name VARCHAR, species VARCHAR
+    )''',
+    'CREATE TABLE IF NOT EXISTS parents (child_id UUID, parent_id UUID)',
+    '''CREATE TABLE IF NOT EXISTS pets (
+        pet_id UUID, owner_id UUID, relation_type VARCHAR,
+        gotcha_date DATE, gotcha_date_precision VARCHAR
+    )''',
+    'CREATE TABLE IF NOT EXISTS marriages (husband_id UUID, wife_id UUID, marriage_id UUID)',
+    'CREATE TABLE IF NOT EXISTS display_names (member_id UUID PRIMARY KEY, full_name VARCHAR)',
+    '''CREATE TABLE IF NOT EXISTS tree.members (
+        member_id UUID PRIMARY KEY,
+        birth_date DATE, birth_date_precision VARCHAR,
+        death_date DATE, death_date_precision VARCHAR,
+        entry_date DATE, entry_date_precision VARCHAR,
+        member_type VARCHAR
+    )''',
+    '''CREATE TABLE IF NOT EXISTS tree.clans (
+        clan_id UUID PRIMARY KEY, clan_name VARCHAR, clan_date DATE
+    )''',
+    '''CREATE TABLE IF NOT EXISTS tree.households (
+        member_id UUID PRIMARY KEY, clan_id UUID, current_clan_id UUID, nee_clan_id UUID
+    )''',
+    'CREATE TABLE IF NOT EXISTS tree.marrieds (person_id UUID, spouse_id UUID, marriage_id UUID)',
+    'CREATE TABLE IF NOT EXISTS nello.founder (founder_id UUID)',
+    ]
+
+_VIEWS = [
+    '''CREATE OR REPLACE VIEW project.folders_summary AS
+    SELECT project_year, folder_name, media_type, full_name, member_id,
+    count(file_id) AS video_count,
+    sum(video_duration) AS video_duration,
+    round(sum(file_size), 1) AS file_size,
+    histogram(video_rating) AS rating_count,
+    histogram(video_resolution) AS resolution_count
+    FROM project.folders LEFT JOIN project.files USING (folder_id)
+    LEFT JOIN display_names USING (member_id)
+    GROUP BY project_year, folder_name, media_type, full_name, member_id
+    ''',
+    '''CREATE OR REPLACE VIEW project.years_summary AS
+    SELECT project_year,
+    count(DISTINCT folder_id) AS total_folders,
+    count(file_id) AS total_videos,
+    sum(video_duration) AS total_duration,
+    round(sum(file_size), 1) AS total_file_size,
+    histogram(video_resolution) AS video_resolutions,
+    histogram(CASE WHEN used_status THEN 'used'
+                   WHEN video_rating IS NOT NULL THEN 'rated'
+                   ELSE 'unrated' END) AS video_status
+    FROM project.folders LEFT JOIN project.files USING (folder_id)
+    GROUP BY project_year
+    ORDER BY project_year
+    ''',
+    # same duration, resolution and size (to the MB) in the same person folder
+    # keep the rated, then shortest named copy first
+    '''CREATE OR REPLACE VIEW project.duplicates_summary AS
+    SELECT folder_name, project_year, media_type,
+    ['duration', 'resolution', 'size'] AS flags,
+    list({'subfolder_name': subfolder_name, 'file_name': file_name}
+         ORDER BY video_rating DESC NULLS LAST, length(file_name), subfolder_name NULLS FIRST) AS duplicates_sorted
+    FROM project.files JOIN project.folders USING (folder_id)
+    WHERE video_duration > 0 AND video_resolution IS NOT NULL
+    GROUP BY folder_name, project_year, media_type, video_duration, video_resolution, round(file_size)
+    HAVING count(*) > 1
+    ''',
+    '''CREATE OR REPLACE VIEW project.appearance_spans AS
+    SELECT project_year, member_id, start_time, end_time, end_time - start_time AS span
+    FROM project.appearances
+    ''',
+    ]
+
+def to_blank_keys(rows:list[dict]) -> list[dict]:
+    ''' Parameters as stored here: '' for missing folder and subfolder names '''
+    return [{k: '' if k in BLANK_KEYS and v is None else v for k, v in row.items()} for row in rows]
+
+def from_blank_keys(df:DataFrame) -> DataFrame:
+    ''' Results as Postgres gives them: NULL for missing folder and subfolder names '''
+    for column in BLANK_KEYS:
+        if column in df.columns:
+            # object so the blanks stay None, not NaN (which is truthy)
+            df[column] = df[column].astype(object).where(df[column] != '', None)
+    return df
+
+def create_embedded_schema(engine:Engine):
+    ''' Create the schemas, tables and summary views if missing '''
+    with engine.begin() as conn:
+        for schema in _SCHEMAS:
+            conn.execute(text(f'CREATE SCHEMA IF NOT EXISTS {schema}'))
+        for sql in _TABLES + _VIEWS:
+            conn.execute(text(sql))
+
+def get_embedded_engine(database_path:Path|str|None=None) -> Engine:
+    ''' Local DuckDB file (or in-memory if no path) with the project schema in place '''
+    if database_path:
+        Path(database_path).parent.mkdir(parents=True, exist_ok=True)
+        engine = create_engine(f'duckdb:///{database_path}')
+    else:
+        # one shared connection, otherwise every checkout would see a blank database
+        engine = create_engine('duckdb:///:memory:', poolclass=StaticPool)
+
+    create_embedded_schema(engine)
+    return engine
@@ -70,7 +70,11 @@ def update_files(engine:Engine, df:DataFrame):
     video_date,
     video_duration,
     video_resolution,
-    video_rating
+    video_rating,
+    content_hash,
+    video_fingerprint,
+    file_bytes,
+    file_mtime_ns
     )
     SELECT
         f.folder_id,
@@ -80,7 +84,11 @@ def update_files(engine:Engine, df:DataFrame):
         :video_date,
         :video_duration,
         :video_resolution,
-        :video_rating
+        :video_rating,
+        :content_hash,
+        :video_fingerprint,
+        :file_bytes,
+        :file_mtime_ns
     FROM project.folders f
     WHERE f.folder_name IS NOT DISTINCT FROM :folder_name
         AND f.project_year = :project_year
@@ -91,7 +99,11 @@ def update_files(engine:Engine, df:DataFrame):
         video_date = EXCLUDED.video_date,
         video_duration = EXCLUDED.video_duration,
         video_resolution = EXCLUDED.video_resolution,
-        video_rating = EXCLUDED.video_rating
+        video_rating = EXCLUDED.video_rating,
+        content_hash = EXCLUDED.content_hash,
+        video_fingerprint = EXCLUDED.video_fingerprint,
+        file_bytes = EXCLUDED.file_bytes,
+        file_mtime_ns = EXCLUDED.file_mtime_ns
     ;'''
     execute_sql(engine, sql, df=df[df['stored']=='local'])
 
@@ -138,13 +150,72 @@ def update_files_used(engine:Engine, df:DataFrame):
 
 def fetch_files_scanned(engine:Engine, media_type:str):
     sql = f'''
-    SELECT folder_name, project_year, media_type, subfolder_name, file_name, video_duration, video_resolution
+    SELECT folder_name, project_year, media_type, subfolder_name, file_name, video_duration, video_resolution,
+    file_size, file_bytes, file_mtime_ns, content_hash, video_fingerprint
     FROM project.files JOIN project.folders USING (folder_id)
     WHERE video_duration IS NOT NULL AND video_resolution IS NOT NULL
     AND media_type = '{media_type}'
     ;'''
     return read_sql(engine, sql)
 
+def add_file_columns(engine:Engine):
+    # content hashes for exact duplicate lookups, fingerprints for re-encoded ones
+    sql = f'''
+    ALTER TABLE project.files ADD COLUMN IF NOT EXISTS content_hash TEXT
+    ;'''
+    execute_sql(engine, sql)
+    sql = f'''
+    ALTER TABLE project.files ADD COLUMN IF NOT EXISTS video_fingerprint TEXT
+    ;'''
+    execute_sql(engine, sql)
+    # exact size and modified time the hash and fingerprint were taken at, so they're only reused for the same bytes
+    sql = f'''
+    ALTER TABLE project.files ADD COLUMN IF NOT EXISTS file_bytes BIGINT
+    ;'''
+    execute_sql(engine, sql)
+    sql = f'''
+    ALTER TABLE project.files ADD COLUMN IF NOT EXISTS file_mtime_ns BIGINT
+    ;'''
+    execute_sql(engine, sql)
+    sql = f'''
+    CREATE INDEX IF NOT EXISTS files_content_hash_idx ON project.files (content_hash)
+    ;'''
+    execute_sql(engine, sql)
+
+def fetch_content_hashes(engine:Engine) -> DataFrame:
+    sql = f'''
+    SELECT supfolder_name, folder_name, project_year, subfolder_name, file_name, content_hash
+    FROM project.files JOIN project.folders USING (folder_id)
+    JOIN config.media USING (media_type)
+    WHERE content_hash IS NOT NULL
+    ;'''
+    return read_sql(engine, sql)
+
+def fetch_hash_duplicates(engine:Engine, media_type:str) -> DataFrame:
+    # every copy of a hash seen more than once, best copy to keep first
+    sql = f'''
+    SELECT content_hash, folder_name, project_year, subfolder_name, file_name, used_status
+    FROM project.files JOIN project.folders USING (folder_id)
+    WHERE media_type = '{media_type}'
+    AND content_hash IN (
+        SELECT content_hash
+        FROM project.files JOIN project.folders USING (folder_id)
+        WHERE media_type = '{media_type}' AND content_hash IS NOT NULL
+        GROUP BY content_hash HAVING count(*) > 1
+        )
+    ORDER BY content_hash, used_status DESC NULLS LAST, video_rating DESC NULLS LAST,
+    project_year, length(file_name)
+    ;'''
+    return read_sql(engine, sql)
+
+def fetch_fingerprints(engine:Engine, media_type:str) -> DataFrame:
+    sql = f'''
+    SELECT folder_name, project_year, subfolder_name, file_name, content_hash, video_fingerprint
+    FROM project.files JOIN project.folders USING (folder_id)
+    WHERE media_type = '{media_type}' AND video_fingerprint IS NOT NULL
+    ;'''
+    return read_sql(engine, sql)
+
 def fetch_duplicates(engine:Engine, media_type:str):
     sql = f'''
     SELECT folder_name, project_year, media_type, flags, duplicates_sorted
@@ -161,6 +232,37 @@ def fetch_shared_albums(engine:Engine) -> DataFrame:
     ;'''
     return read_sql(engine, sql)
 
+def add_album_manifests(engine:Engine):
+    # what each shared album held at its last harvest
+    sql = f'''
+    CREATE TABLE IF NOT EXISTS ingestion.album_manifests (
+        album_id INTEGER PRIMARY KEY,
+        item_count INTEGER NOT NULL,
+        item_ids TEXT,
+        harvested_at TIMESTAMP
+    )
+    ;'''
+    execute_sql(engine, sql)
+
+def fetch_album_manifests(engine:Engine) -> DataFrame:
+    sql = f'''
+    SELECT album_id, item_count, item_ids, harvested_at
+    FROM ingestion.album_manifests
+    ;'''
+    return read_sql(engine, sql)
+
+def update_album_manifests(engine:Engine, df:DataFrame):
+    sql = f'''
+    INSERT INTO ingestion.album_manifests (album_id, item_count, item_ids, harvested_at)
+    VALUES (:album_id, :item_count, :item_ids, :harvested_at)
+    ON CONFLICT (album_id) DO UPDATE
+
+    SET item_count = EXCLUDED.item_count,
+        item_ids = EXCLUDED.item_ids,
+        harvested_at = EXCLUDED.harvested_at
+    ;'''
+    execute_sql(engine, sql, df=df)
+
 def fetch_years_summary(engine:Engine) -> DataFrame:
     sql = f'''
     SELECT project_year, total_folders, total_videos, total_duration, total_file_size,
@@ -5,12 +5,17 @@ import argparse
 from pandas import DataFrame
 
 from common.structure import ONE_DRIVE_FOLDER, GOOGLE_DRIVE_FOLDER, ADOBE_FOLDER, YIR_REVIEWS, QUARANTINE_FOLDER, QUARANTINE
+from common.structure import DB_BACKEND, DB_EMBEDDED_PATH, COPY_WORKERS, COPY_BANDWIDTH, HARVEST_WORKERS, HARVEST_DOWNLOADS, HARVEST_BANDWIDTH, HYDRATE_WORKERS, HYDRATE_BUDGET, CACHE_FOLDER
 from common.secret import secrets
 from common.console import SplitConsole
-from database.db import get_engine
+from common.journal import start_plan, save_plan, load_plan, stale_steps
+from common.hydrate import find_placeholders, hydrate_files
+from database.db import get_engine, report_queries
 from repositories.migrate import dedupe_one_drive, copy_from_gdrive
 from repositories.ingest import copy_from_web
-from repositories.inspect import get_media_locations, summarize_folders, update_database_images, purge_stale_content
+from repositories.inspect import (get_media_locations, summarize_folders, update_database_images, purge_stale_content,
+                                  load_hash_index)
+from repositories.replay import apply_plan
 
 PGSECRETS = secrets['postgresql']['host']
 PGHOST = secrets['postgresql']['host']
@@ -25,10 +30,12 @@ CLOUDINARY_API_SECRET = secrets['cloudinary']['api_secret']
 
 MIN_STARS = 3
 
-ui = SplitConsole()
+# created in main(), so worker processes that re-import this module don't take over the console
+ui: SplitConsole|None = None
 
 def set_up_engine():
-    return get_engine(PGHOST, PGPORT, PGDBNAME, PGUSER, PGPASSWORD)
+    return get_engine(PGHOST, PGPORT, PGDBNAME, PGUSER, PGPASSWORD,
+                      backend=DB_BACKEND, embedded_path=DB_EMBEDDED_PATH)
 
 def set_up_media_locations():
     engine = set_up_engine()
@@ -38,11 +45,14 @@ def set_up_media_locations():
 
 def scan_folders(media_locations:DataFrame, dry_run:bool=True):
     engine = set_up_engine()
+    hash_index = load_hash_index(engine, ONE_DRIVE_FOLDER)
 
     for _, (media_type, supfolder_name) in media_locations.iterrows():
         if (GOOGLE_DRIVE_FOLDER / supfolder_name).exists():
             missing_targets = copy_from_gdrive(ONE_DRIVE_FOLDER / supfolder_name, GOOGLE_DRIVE_FOLDER / supfolder_name,
-                                               QUARANTINE_FOLDER, QUARANTINE, ui, dry_run)
+                                               QUARANTINE_FOLDER, QUARANTINE, ui, dry_run,
+                                               workers=COPY_WORKERS, bytes_per_second=COPY_BANDWIDTH,
+                                               hash_index=hash_index)
 
             if dry_run and missing_targets:
                 ui.add_update("\n(Note) These OneDrive destination folders do not exist yet (will be created on --apply if needed):")
@@ -60,9 +70,48 @@ def dedupe_folders(media_locations, dry_run:bool=True):
 
 def harvest_albums(google:bool, icloud:bool, headless:bool=True):
     engine = set_up_engine()
-    copy_from_web(engine, ONE_DRIVE_FOLDER, google=google, icloud=icloud, headless=headless)
+    hash_index = load_hash_index(engine, ONE_DRIVE_FOLDER)
+    results = copy_from_web(engine, ONE_DRIVE_FOLDER, google=google, icloud=icloud, headless=headless,
+                            quarantine_folder=QUARANTINE_FOLDER, quarantine=QUARANTINE, hash_index=hash_index,
+                            workers=HARVEST_WORKERS, bytes_per_second=HARVEST_BANDWIDTH,
+                            download_workers=HARVEST_DOWNLOADS)
     engine.dispose()
 
+    if results:
+        ui.add_update('\n=== Harvest Summary ===')
+        for r in sorted(results, key=lambda x: x['album']):
+            if r['unchanged']:
+                ui.add_update(f'{r["album"]} ({r["source"]}): unchanged, {r["seconds"]:,.0f} s')
+                continue
+            line = f'{r["album"]} ({r["source"]}): {r["downloaded"]} downloaded, {r["quarantined"]} quarantined, {r["seconds"]:,.0f} s'
+            ui.add_update(line + (f' -- failed: {r["error"]}' if r['error'] else ''))
+        n_failed = sum(1 for r in results if r['error'])
+        n_unchanged = sum(1 for r in results if r['unchanged'])
+        ui.add_update(f'{len(results)} albums ({n_unchanged} unchanged), {sum(r["downloaded"] for r in results)} files downloaded, '
+                      f'{sum(r["quarantined"] for r in results)} quarantined, {n_failed} failed')
+
+def hydrate_year(media_locations:DataFrame, year:int):
+    # pull down the year's cloud-only videos and review projects before they are inspected
+    ui.set_status(f'Looking for placeholders in {year}...')
+    folders = [ONE_DRIVE_FOLDER / supfolder_name / str(year) for _, (_, supfolder_name) in media_locations.iterrows()]
+    placeholders = find_placeholders(folders, ADOBE_FOLDER / f'{YIR_REVIEWS} {year}')
+    if not placeholders:
+        ui.add_update(f'Everything for {year} is already local.')
+        return
+
+    def show_progress(n, n_total, b, b_total):
+        ui.set_status(f'Hydrating {year}: {n}/{n_total} files, {b / 1024**2:,.0f}/{b_total / 1024**2:,.0f} MB')
+
+    hydrated, failed, skipped = hydrate_files(placeholders, workers=HYDRATE_WORKERS, max_bytes=HYDRATE_BUDGET,
+                                              progress=show_progress)
+
+    ui.add_update(f'\n=== Hydration Summary ({year}) ===')
+    ui.add_update(f'{len(hydrated)} files downloaded from OneDrive')
+    for p, e in failed:
+        ui.add_update(f'Could not hydrate {p}: {e}')
+    if skipped:
+        ui.add_update(f'{len(skipped)} files left in the cloud, over the {HYDRATE_BUDGET / 1024**3:,.0f} GB budget')
+
 def purge_database(media_locations:DataFrame, dry_run:bool=True):
     engine = set_up_engine()
     for _, (media_type, supfolder_name) in media_locations.iterrows():
@@ -73,7 +122,8 @@ def update_database(media_locations:DataFrame, dry_run:bool=True):
     engine = set_up_engine()
 
     for _, (media_type, supfolder_name) in media_locations.iterrows():
-        summarize_folders(engine, ONE_DRIVE_FOLDER / supfolder_name, media_type, ADOBE_FOLDER, YIR_REVIEWS, ui, dry_run=dry_run)
+        summarize_folders(engine, ONE_DRIVE_FOLDER / supfolder_name, media_type, ADOBE_FOLDER, YIR_REVIEWS, ui, dry_run=dry_run,
+                          cache_folder=CACHE_FOLDER)
     engine.dispose()
 
 def update_images(dry_run:bool=True):
@@ -81,7 +131,27 @@ def update_images(dry_run:bool=True):
     update_database_images(engine, CLOUDINARY_CLOUD, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET, dry_run=dry_run)
     engine.dispose()
 
+def run_plan(plan_path:str) -> bool:
+    steps = load_plan(plan_path)
+    ui.add_update(f'Checking {len(steps)} planned steps from {plan_path}...')
+
+    # anything touched since the dry run means the plan no longer describes the files
+    stale = stale_steps(steps)
+    if stale:
+        ui.add_update(f'Plan is stale, {len(stale)} steps changed since it was made. Run --dry-run --plan again.')
+        for i, path in stale[:10]:
+            ui.add_update(f'  - step {i} ({steps[i]["action"]}): {path}')
+        return False
+
+    engine = set_up_engine()
+    apply_plan(engine, steps, ui, workers=COPY_WORKERS, bytes_per_second=COPY_BANDWIDTH)
+    engine.dispose()
+    return True
+
 def main():
+    global ui
+    ui = SplitConsole()
+
     ap = argparse.ArgumentParser(description=f"Scan for new files and import into current year's Premiere review project.")
     
     # run Selenium w/ or w/o head
@@ -100,16 +170,32 @@ def main():
     ap.add_argument('--pictures', nargs='?', type=bool, const=True, default=False, help='Update Premiere project with bins and imports.')
 
     ap.add_argument('--stars', type=int, default=MIN_STARS, help='Minimum star rating to use in project.')
+    ap.add_argument('--hydrate', type=int, default=None, help='Download cloud-only files for this year before scanning.')
 
     group = ap.add_mutually_exclusive_group()
     group.add_argument("--apply", action="store_true", help="Actually copy files.")
     group.add_argument("--dry-run", action="store_true", help="Do not copy or download; show what would happen.")
+    group.add_argument('--apply-plan', type=str, default=None, help='Apply a plan saved by --plan without rescanning.')
+    ap.add_argument('--plan', type=str, default=None, help='With a dry run, save what would happen to this JSON file.')
     
+    ap.add_argument('--query-log', type=str, default=None, help='Write per-query timings to this JSON file.')
+
     args = ap.parse_args()
     dry_run = not args.apply  # default to dry-run unless --apply
+    if args.plan and args.apply:
+        ap.error('--plan records a dry run, it cannot be used with --apply')
 
     ui.add_update(f'Running with args: {args}')
 
+    if args.apply_plan:
+        run_plan(args.apply_plan)
+        report_queries(ui, args.query_log)
+        ui.set_status("Done.")
+        return
+
+    if args.plan:
+        start_plan()
+
     media_locations = set_up_media_locations()
 
     if args.gphotos or args.iphotos:
@@ -118,6 +204,9 @@ def main():
     if args.gdrive:
         scan_folders(media_locations, dry_run=dry_run)
 
+    if args.hydrate:
+        hydrate_year(media_locations, args.hydrate)
+
     if not args.no_dbupdate:
         purge_database(media_locations, dry_run=dry_run)
         update_database(media_locations, dry_run=dry_run)
@@ -127,6 +216,12 @@ def main():
     if args.pictures:
         update_images(dry_run=dry_run)
 
+    if args.plan:
+        save_plan(args.plan)
+        ui.add_update(f'Plan written to {args.plan}, apply it with --apply-plan {args.plan}')
+
+    report_queries(ui, args.query_log)
+
     ui.set_status("Done.")
 
 if __name__ == "__main__":
@@ -7,7 +7,9 @@ from common.console import SplitConsole
 from common.system import get_person_folders, get_person_name, get_person_names, rebuild_path, resolve_relative_path
 from database.db_project import fetch_files
 from database.db_adobe import fetch_member_labels, fetch_color_labels, update_appearances, update_chapters, fetch_compilation
-from adobe.premiere import convert_to_xml, extract_included_video_paths, open_project, find_videos_bin, create_person_bins, \
+from adobe.prproj import convert_to_xml, extract_included_video_paths, PremiereProject
+from adobe.prproj import get_actors_in_project as get_actors_in_project_file, get_chapter_markers as get_chapter_markers_file
+from adobe.premiere import open_project, find_videos_bin, create_person_bins, get_bin_snapshot, \
     import_videos, set_family_color_labels, create_label_presets, get_sequence_maps, get_actors_in_project, get_chapter_markers
 
 def get_usable_videos(engine:Engine, year:int, min_stars:int):
@@ -15,16 +17,19 @@ def get_usable_videos(engine:Engine, year:int, min_stars:int):
     usable_videos = files_df.query('video_rating >= @min_stars')
     return usable_videos
 
-def ensure_premiere(engine:Engine, year:int, adobe_folder:Path, yir_reviews:str, pr_ext:str, 
-                    ui:SplitConsole) -> int|None:
-    ui.set_status('Opening Premiere project...')
-
+def get_project_path(engine:Engine, year:int, adobe_folder:Path, yir_reviews:str, pr_ext:str) -> Path|None:
     project_folder = adobe_folder / f'{yir_reviews} {year}'
     compilation_df = fetch_compilation(engine, year)
     if not compilation_df.empty:
         file_name = compilation_df['file_name'].iloc[0]
+        return project_folder / f'{file_name}{pr_ext}'
 
-        project_path =  project_folder / f'{file_name}{pr_ext}'
+def ensure_premiere(engine:Engine, year:int, adobe_folder:Path, yir_reviews:str, pr_ext:str, 
+                    ui:SplitConsole) -> int|None:
+    ui.set_status('Opening Premiere project...')
+
+    project_path = get_project_path(engine, year, adobe_folder, yir_reviews, pr_ext)
+    if project_path:
         project_id = open_project(project_path)
 
         return project_id
@@ -32,16 +37,11 @@ def ensure_premiere(engine:Engine, year:int, adobe_folder:Path, yir_reviews:str,
 def import_and_label(engine:Engine, project_id:int, year:int, min_stars:int, one_drive_folder:Path,
                      ui:SplitConsole, dry_run=True):
     
-    ui.set_status('Finding Videos bin')
-    videos_bin = find_videos_bin(project_id)
-
-    ui.set_status('Creating person bins...')
     one_drive_year_folder = one_drive_folder / f'{year}'
     person_folders = get_person_folders(one_drive_year_folder)
     person_names = get_person_names(one_drive_year_folder)
-    create_person_bins(videos_bin, person_names)
 
-    ui.set_status(f'Importing reviewed videos ({min_stars} star and above)...')
+    ui.set_status(f'Finding reviewed videos ({min_stars} star and above)...')
 
     # check what's already in the project
     # # root = convert_to_xml(project_path)
@@ -51,51 +51,121 @@ def import_and_label(engine:Engine, project_id:int, year:int, min_stars:int, one
     # pull from DB
     usable_videos = get_usable_videos(engine, year, min_stars)
 
+    videos_by_person = {}
     for person_folder in person_folders:
-        person_name = get_person_name(person_folder)
-        ui.set_status(f'\tLooking at {person_name}...')
-
         usable_videos_person = usable_videos.query('folder_name == @person_folder.name')
-       
         if not usable_videos_person.empty:
-            usable_video_paths = [rebuild_path(one_drive_year_folder, person_folder.name, v['subfolder_name'], v['file_name']) for _, v in usable_videos_person.iterrows()]
-
-            num_videos = len(usable_video_paths)
-            v_s = 's' if num_videos != 1 else ''
-            ui.set_status(f'Checking {len(usable_videos_person)} video{v_s} for {person_name}...')
-            import_videos(project_id, videos_bin, person_name, usable_video_paths, ui, dry_run)
-
-    ui.set_status('Setting labels...')
+            videos_by_person[get_person_name(person_folder)] = \
+                [rebuild_path(one_drive_year_folder, person_folder.name, v['subfolder_name'], v['file_name'])
+                 for _, v in usable_videos_person.iterrows()]
 
     member_labels = fetch_member_labels(engine, year)
     member_labels['bin_name'] = member_labels['folder_name'].apply(get_person_name)
     label_map = member_labels.set_index('bin_name')['label_id'].sub(1).to_dict()
-    set_family_color_labels(videos_bin, label_map)
+
+    place_videos(project_id, person_names, videos_by_person, label_map, ui, dry_run)
+
+def place_videos(project_id:int, person_names:list[str], videos_by_person:dict[str, list[Path]],
+                 label_map:dict[str, int], ui:SplitConsole, dry_run=True):
+    # the Premiere side of import_and_label: person bins, imports and family color labels
+    ui.set_status('Finding Videos bin')
+    videos_bin = find_videos_bin(project_id)
+
+    ui.set_status('Creating person bins...')
+    create_person_bins(videos_bin, person_names)
+
+    # what the Videos bin holds now, read once
+    snapshot = get_bin_snapshot(project_id)
+
+    for person_name, video_paths in videos_by_person.items():
+        num_videos = len(video_paths)
+        v_s = 's' if num_videos != 1 else ''
+        ui.set_status(f'Checking {num_videos} video{v_s} for {person_name}...')
+        import_videos(project_id, snapshot, person_name, video_paths, ui, dry_run)
+
+    ui.set_status('Setting labels...')
+
+    # fresh snapshot so clips imported above are labelled too
+    relabelled = set_family_color_labels(project_id, label_map, get_bin_snapshot(project_id))
+    ui.add_update(f'{relabelled} clip labels updated')
 
 def setup_label_presets(engine:Engine, common_folder:Path, label_preset_name:str):
     color_labels = fetch_color_labels(engine)
     return create_label_presets(color_labels, common_folder, label_preset_name)
 
+def save_appearances(engine:Engine, project_year:int, actor_timestamps:list) -> DataFrame:
+    # one row per member per clip, from either the running Premiere or the saved project
+    actor_times_df = (DataFrame(actor_timestamps, columns=['actor_uuid', 'start_time', 'end_time'])
+                      .explode('actor_uuid', ignore_index=True)
+                      .rename(columns={'actor_uuid': 'member_id'})
+                      .drop_duplicates())
+    actor_times_df['project_year'] = project_year
+    update_appearances(engine, project_year, actor_times_df)
+    return actor_times_df
+
+def save_chapters(engine:Engine, project_year:int, chapter_timestamps:list) -> DataFrame:
+    chapter_markers_df = DataFrame(chapter_timestamps, columns=['chapter_name', 'start_time'])
+    chapter_markers_df['project_year'] = project_year
+    update_chapters(engine, project_year, chapter_markers_df)
+    return chapter_markers_df
+
 def get_actors_and_chapters(engine:Engine, project_id:int, project_year:int):
     compilation_df = fetch_compilation(engine, project_year)
     if not compilation_df.empty:
         timeline_name, banned_bins = compilation_df[['timeline_name', 'banned_bins']].iloc[0]
 
-        print('Getting sequence maps')
-        sequence_map_by_name, sequence_map_by_node = get_sequence_maps(project_id)
+        actor_timestamps, chapter_timestamps = read_actors_and_chapters(project_id, timeline_name, banned_bins)
+
+        save_appearances(engine, project_year, actor_timestamps)
+        
+        save_chapters(engine, project_year, chapter_timestamps)
 
-        actor_timestamps = get_actors_in_project(project_id, timeline_name, sequence_map_by_name, sequence_map_by_node,
-                                                 banned_bins=banned_bins)
+def read_actors_and_chapters(project_id:int, timeline_name:str, banned_bins:list[str]|None):
+    # the Premiere side of get_actors_and_chapters
+    print('Getting sequence maps')
+    sequence_map_by_name, sequence_map_by_node = get_sequence_maps(project_id)
+
+    actor_timestamps = get_actors_in_project(project_id, timeline_name, sequence_map_by_name, sequence_map_by_node,
+                                             banned_bins=banned_bins)
+    chapter_timestamps = get_chapter_markers(project_id, timeline_name, sequence_map_by_name)
+    return actor_timestamps, chapter_timestamps
 
-        actor_times_df = (DataFrame(actor_timestamps).explode('actor_uuid', ignore_index=True)
-                          .rename(columns={'actor_uuid': 'member_id'})
-                          .drop_duplicates())
-        actor_times_df['project_year'] = project_year
-        update_appearances(engine, actor_times_df)
         
-        chapter_timestamps = get_chapter_markers(project_id, timeline_name, sequence_map_by_name)
-        chapter_markers_df = DataFrame(chapter_timestamps, columns=['chapter_name', 'start_time'])
-        chapter_markers_df['project_year'] = project_year
-        update_chapters(engine, chapter_markers_df)
+def read_project_file(project_path:Path, ui:SplitConsole) -> PremiereProject|None:
+    ui.set_status(f'Reading {project_path.name}...')
+    project = PremiereProject.from_file(project_path, keep_tags=None)
+    if project is None:
+        ui.add_update(f'Could not read {project_path}')
+    return project
+
+def get_actors_offline(engine:Engine, project:PremiereProject, project_year:int, ui:SplitConsole):
+    # same appearances as get_actors_and_chapters, from the saved project instead of a running Premiere
+    compilation_df = fetch_compilation(engine, project_year)
+    if not compilation_df.empty:
+        timeline_name, banned_bins = compilation_df[['timeline_name', 'banned_bins']].iloc[0]
+
+        actor_timestamps = get_actors_in_project_file(project, timeline_name, banned_bins=banned_bins)
+        if actor_timestamps is None:
+            # the timeline is gone, so are its appearances
+            save_appearances(engine, project_year, [])
+            ui.add_update(f'No timeline named {timeline_name} in the project')
+            return
+
+        actor_times_df = save_appearances(engine, project_year, actor_timestamps)
+        ui.add_update(f'{len(actor_times_df)} appearances read from the project file')
+
+def get_chapters_offline(engine:Engine, project:PremiereProject, project_year:int, ui:SplitConsole):
+    # same chapters as get_actors_and_chapters, from the saved project instead of a running Premiere
+    compilation_df = fetch_compilation(engine, project_year)
+    if not compilation_df.empty:
+        timeline_name = compilation_df['timeline_name'].iloc[0]
+
+        chapter_timestamps = get_chapter_markers_file(project, timeline_name)
+        if chapter_timestamps is None:
+            # the timeline is gone, so are its chapters
+            save_chapters(engine, project_year, [])
+            ui.add_update(f'No timeline named {timeline_name} in the project')
+            return
 
-        
\ No newline at end of file
+        chapter_markers_df = save_chapters(engine, project_year, chapter_timestamps)
+        ui.add_update(f'{len(chapter_markers_df)} chapters read from the project file')
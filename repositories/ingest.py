@@ -1,9 +1,122 @@
-from database.db_project import fetch_shared_albums
-from scraping.photos import source_allowed, harvest_shared_album
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from time import monotonic
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def copy_from_web(engine, one_drive_folder, google=True, icloud=True, headless=False):
+from common.hashing import content_hash, HashIndex
+from common.transfer import Bandwidth, move_file
+from pandas import DataFrame
+
+from database.db_project import fetch_shared_albums, add_album_manifests, fetch_album_manifests, update_album_manifests
+from scraping.photos import (source_allowed, harvest_shared_album, make_driver, limit_bandwidth, clone_profile,
+                             close_stale_browsers)
+from scraping.manifest import is_unchanged
+
+def quarantine_download(file_path:Path, hash_index:HashIndex, quarantine_directory:Path) -> bool:
+    ''' Move a fresh download into quarantine if it is a byte-for-byte copy of a library file '''
+    file_hash = content_hash(file_path)
+    if (copy_of := hash_index.find(file_hash, exclude=file_path)):
+        print(f'{file_path.name} is identical to {copy_of}, moving to quarantine.')
+        move_file(file_path, quarantine_directory / file_path.name)
+        return True
+
+    hash_index.add(file_path, file_hash)
+    return False
+
+def harvest_profile(jobs:list[dict], browser_name:str, browser_profile:str, headless:bool=True,
+                    clone_root:Path|None=None, bytes_per_second:int|None=None, bandwidth:Bandwidth|None=None,
+                    download_workers:int=4, hash_index:HashIndex|None=None, index_lock=None) -> list[dict]:
+    ''' Albums that share a browser profile, one after another on a single driver '''
+    results = []
+    user_data_dir = None
+    driver = None
+
+    for job in jobs:
+        start = monotonic()
+        result = {'album': job['album'], 'album_id': job['album_id'], 'source': job['scrape_name'],
+                  'profile': browser_profile, 'downloaded': 0, 'quarantined': 0, 'unchanged': False,
+                  'listing': None, 'error': None}
+        try:
+            if driver is None:
+                if clone_root and user_data_dir is None:
+                    user_data_dir = clone_profile(browser_name.lower(), browser_profile, clone_root)
+                driver = make_driver(headless=headless, browser=browser_name, browser_profile=browser_profile,
+                                     download_directory=job['download_directory'], user_data_dir=user_data_dir,
+                                     close_stale=False)
+                if driver is None:
+                    raise ValueError(f'Unsupported browser {browser_name}')
+                limit_bandwidth(driver, bytes_per_second)
+
+            on_complete = None
+            if hash_index is not None and job['quarantine_directory']:
+                def on_complete(file_path, quarantine_directory=job['quarantine_directory'], result=result):
+                    # checked as each download lands; the index is shared by every profile's thread
+                    with index_lock:
+                        result['quarantined'] += quarantine_download(file_path, hash_index, quarantine_directory)
+
+            downloaded_files, listing = harvest_shared_album(job['url'], job['download_directory'], job['scrape_name'],
+                                                             browser_name, browser_profile, headless=headless,
+                                                             driver=driver, workers=download_workers,
+                                                             bandwidth=bandwidth, manifest=job['manifest'],
+                                                             on_complete=on_complete)
+            result['downloaded'] = len(downloaded_files or [])
+            result['unchanged'] = is_unchanged(job['manifest'], listing)
+
+            # only once everything is in, so a broken run is looked at again next time
+            result['listing'] = listing
+
+        except Exception as e:
+            # one broken album shouldn't stop the rest; start the next one on a fresh browser
+            result['error'] = (str(e).strip().splitlines() or [type(e).__name__])[0]
+            if driver is not None:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = None
+
+        result['seconds'] = monotonic() - start
+        results.append(result)
+
+    if driver is not None:
+        driver.quit()
+
+    return results
+
+def read_manifests(manifests_df:DataFrame) -> dict[int, dict]:
+    ''' Last harvest's listing for each album '''
+    return {row['album_id']: {'item_count': row['item_count'], 'item_ids': json.loads(row['item_ids'] or '[]')}
+            for _, row in manifests_df.iterrows()}
+
+def record_manifests(engine, results:list[dict]):
+    ''' Store the listings of albums harvested cleanly this run '''
+    harvested_at = datetime.now()
+    rows = [{'album_id': r['album_id'], 'item_count': r['listing']['item_count'],
+             'item_ids': json.dumps(r['listing']['item_ids']), 'harvested_at': harvested_at}
+            for r in results if r['listing'] and not r['error']]
+    update_album_manifests(engine, DataFrame(rows))
+
+def copy_from_web(engine, one_drive_folder, google=True, icloud=True, headless=False,
+                  quarantine_folder:Path|None=None, quarantine:str|None=None, hash_index:HashIndex|None=None,
+                  workers:int=1, bytes_per_second:int|None=None, download_workers:int=4) -> list[dict]:
+    '''
+    Harvest every shared album, running up to workers browser profiles at once.
+    Each profile gets one driver for all its albums and downloads up to download_workers files at a time;
+    bytes_per_second caps all of it together.
+    Albums whose item count and leading items match their manifest from the last harvest are skipped.
+    Returns a result per album for the harvest report.
+    '''
     albums = fetch_shared_albums(engine)
-    for _, (_, url, folder_name, project_year, supfolder_name,
+    add_album_manifests(engine)
+    manifests = read_manifests(fetch_album_manifests(engine))
+
+    # a profile can only be open in one browser at a time, so albums queue up by profile
+    queues: dict[tuple[str, str], list[dict]] = {}
+    for _, (album_id, url, folder_name, project_year, supfolder_name,
             scrape_name, browser_name, profile_name, notes) in albums.iterrows():
         
         if notes:
@@ -15,5 +128,51 @@ def copy_from_web(engine, one_drive_folder, google=True, icloud=True, headless=F
             download_directory = one_drive_folder / supfolder_name / str(project_year) / folder_name
 
             if source_allowed(share_source, google=google, icloud=icloud):
-                harvest_shared_album(url, download_directory, scrape_name, browser_name, browser_profile,
-                                     headless=headless)
\ No newline at end of file
+                quarantine_directory = None
+                if quarantine_folder:
+                    quarantine_directory = quarantine_folder / supfolder_name / quarantine / str(project_year) / folder_name
+                queues.setdefault((browser_name.lower(), browser_profile), []).append(
+                    {'album': f'{folder_name} {project_year}', 'album_id': album_id, 'url': url,
+                     'scrape_name': scrape_name, 'manifest': manifests.get(album_id),
+                     'download_directory': download_directory, 'quarantine_directory': quarantine_directory})
+
+    if not queues:
+        return []
+
+    n_drivers = max(1, min(workers, len(queues)))
+    driver_bandwidth = bytes_per_second // n_drivers if bytes_per_second else None
+
+    # stale Edge is closed once here, since closing it per driver would kill the other drivers
+    close_stale_browsers(list({browser for browser, _ in queues}))
+
+    # the first profile of each browser opens in place, the rest from copies in their own user data folders
+    clone_root = Path(tempfile.mkdtemp(prefix='yir-profiles-')) if n_drivers > 1 else None
+    in_place = set()
+    clone_roots = {}
+    for browser, browser_profile in queues:
+        if clone_root is None or browser not in in_place:
+            in_place.add(browser)
+            clone_roots[(browser, browser_profile)] = None
+        else:
+            clone_roots[(browser, browser_profile)] = clone_root
+
+    results = []
+    index_lock = threading.Lock()
+    # direct downloads bypass the browsers' throttling, so they draw on one shared allowance
+    bandwidth = Bandwidth(bytes_per_second)
+    try:
+        with ThreadPoolExecutor(max_workers=n_drivers) as pool:
+            futures = [pool.submit(harvest_profile, jobs, browser, browser_profile, headless,
+                                   clone_roots[(browser, browser_profile)], driver_bandwidth, bandwidth,
+                                   download_workers, hash_index, index_lock)
+                       for (browser, browser_profile), jobs in queues.items()]
+            for future in as_completed(futures):
+                profile_results = future.result()
+                # written as each profile finishes, so an interrupted run keeps what it finished
+                record_manifests(engine, profile_results)
+                results.extend(profile_results)
+    finally:
+        if clone_root:
+            shutil.rmtree(clone_root, ignore_errors=True)
+
+    return results
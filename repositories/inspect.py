@@ -1,4 +1,5 @@
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, Future
 
 from pandas import DataFrame, concat
 from sqlalchemy import Engine
@@ -8,11 +9,16 @@ from common.system import (
     get_premiere_projects_in_folder, get_videos_in_folder, resolve_relative_path, rebuild_path, is_file_available, sort_paths,
     get_year_folders, get_person_folders
     )
+from common.hashing import content_hash, HashIndex
+from common.fingerprint import video_fingerprints
+from common.journal import record_db
+from common.cache import SignatureCache
 from adobe.bridge import get_video_rating, get_video_date, get_video_cv2_details, is_file_available
-from adobe.premiere import convert_to_xml, extract_used_video_paths
+from adobe.prproj import used_media_in_project
 from database.db_project import (
     fetch_known_folders, update_folders, purge_folders, fetch_media_types,
     fetch_known_files, update_files, purge_files, fetch_files, fetch_files_scanned, update_files_used,
+    add_file_columns, fetch_content_hashes,
     )
 from database.db_display import fetch_display_names
     
@@ -21,6 +27,16 @@ from family_tree.cloudinary_heavy import configure_cloud, fill_in_temp_pictures
 def get_media_locations(engine: Engine) -> DataFrame:
     return fetch_media_types(engine)
 
+def load_hash_index(engine:Engine, one_drive_root:Path) -> HashIndex:
+    ''' Content hashes of everything ingested so far, keyed to their OneDrive paths '''
+    add_file_columns(engine)
+    hash_index = HashIndex()
+    for _, row in fetch_content_hashes(engine).iterrows():
+        year_folder = one_drive_root / row['supfolder_name'] / str(row['project_year'])
+        file_path = rebuild_path(year_folder, row['folder_name'] or '', row['subfolder_name'], row['file_name'])
+        hash_index.add(file_path, row['content_hash'])
+    return hash_index
+
 def get_child_from_relative(parent_folder:Path, full_path:Path) -> Path:
     return parent_folder / full_path.relative_to(parent_folder).parents[-2]
 
@@ -33,6 +49,11 @@ def get_to_purge(known_df: DataFrame, found_df: DataFrame, on_cols: list[str]) -
 
 def purge_stale_content(engine:Engine, one_drive_folder:Path, media_type:str, dry_run:bool):
     # purge stale
+    if not get_year_folders(one_drive_folder):
+        # an unmounted or unsynced library would look like everything was deleted
+        print(f'No year folders in {one_drive_folder}, not purging {media_type} content.')
+        return
+
     print(f'Purging stale {media_type} content...')
     current_folders = []
     current_roots = []
@@ -90,6 +111,16 @@ def purge_stale_content(engine:Engine, one_drive_folder:Path, media_type:str, dr
             purge_folders(engine, purged_folders)
         if len(purged_files):
             purge_files(engine, concat(purged_files))
+    else:
+        # only valid while the purged paths are still gone
+        if not purged_folders.empty:
+            record_db('purge_folders', purged_folders[['folder_id']],
+                      [one_drive_folder / str(r['project_year']) / (r['folder_name'] or '') for _, r in purged_folders.iterrows()])
+        if len(purged_files):
+            purged_files_df = concat(purged_files)
+            record_db('purge_files', purged_files_df[['file_id']],
+                      [rebuild_path(one_drive_folder / str(r['project_year']), r['folder_name'] or '', r['subfolder_name'], r['file_name'])
+                       for _, r in purged_files_df.iterrows()])
 
 
 def summarize_files(person_folder:Path, is_root:bool, year:int, video_files:list[Path], scanned_df:DataFrame) -> DataFrame:
@@ -101,7 +132,10 @@ def summarize_files(person_folder:Path, is_root:bool, year:int, video_files:list
     files_df['folder_name'] = person_folder.name if not is_root else None
     files_df['subfolder_name'] = files_df['full_path'].apply(lambda x: get_subfolder_name(person_folder, x))
     files_df['project_year'] = year
-    files_df['file_size'] = files_df['full_path'].apply(lambda x: round(x.stat().st_size / (1024**2), 1)) # store in MB
+    stats = files_df['full_path'].apply(lambda x: x.stat())
+    files_df['file_size'] = stats.apply(lambda x: round(x.st_size / (1024**2), 1)) # store in MB
+    files_df['file_bytes'] = stats.apply(lambda x: x.st_size).astype('Int64')
+    files_df['file_mtime_ns'] = stats.apply(lambda x: x.st_mtime_ns).astype('Int64')
     files_df['video_rating'] = files_df['full_path'].apply(get_video_rating).astype('Int64')
 
     files_df['video_date'] = files_df['full_path'].apply(get_video_date).astype('datetime64[ns]')
@@ -122,11 +156,44 @@ def summarize_files(person_folder:Path, is_root:bool, year:int, video_files:list
     files_df['video_duration'] = files_df['video_duration'].astype('Int64')
     files_df['video_resolution'] = files_df['video_resolution'].astype('string')
 
+    # content hash for exact duplicate lookups, reused while the exact size and modified time are unchanged
+    hash_cols = ['file_name', 'folder_name', 'subfolder_name', 'file_bytes', 'file_mtime_ns']
+    scanned_df = scanned_df.astype({'file_bytes': 'Int64', 'file_mtime_ns': 'Int64'})
+    files_df['content_hash'] = files_df.merge(scanned_df[hash_cols + ['content_hash']], on=hash_cols, how='left')['content_hash']
+    hash_update = files_df['content_hash'].isna() & (files_df['stored'] == 'local')
+    if hash_update.any():
+        files_df.loc[hash_update, 'content_hash'] = files_df.loc[hash_update, 'full_path'].apply(content_hash)
+    files_df['content_hash'] = files_df['content_hash'].astype(object).where(files_df['content_hash'].notnull(), None)
+
+    # perceptual fingerprint for re-encoded duplicate lookups, same reuse rule (failures included)
+    files_df['video_fingerprint'] = files_df.merge(scanned_df[hash_cols + ['video_fingerprint']], on=hash_cols, how='left')['video_fingerprint']
+    fingerprint_update = files_df['video_fingerprint'].isna() & (files_df['stored'] == 'local')
+    if fingerprint_update.any():
+        files_df.loc[fingerprint_update, 'video_fingerprint'] = video_fingerprints(files_df.loc[fingerprint_update, 'full_path'].tolist())
+    files_df['video_fingerprint'] = files_df['video_fingerprint'].astype(object).where(files_df['video_fingerprint'].notnull(), None)
+
     return files_df
 
-def check_files_used(project_path:Path) -> list[Path]:
-    root = convert_to_xml(project_path)
-    relative_paths = extract_used_video_paths(root)
+def parse_projects(pool:ProcessPoolExecutor, project_paths:list[Path],
+                   project_cache:SignatureCache|None=None) -> dict[Path, Future]:
+    # start parsing every local project that the cache can't answer
+    return {p: pool.submit(used_media_in_project, p) for p in project_paths
+            if (not project_cache or project_cache.get(p) is None) and is_file_available(p)}
+
+def check_files_used(project_path:Path, project_cache:SignatureCache|None=None,
+                     parsing:Future|None=None) -> list[Path]|None:
+    # unchanged projects are answered from the cache, even while they are cloud-only
+    relative_paths = project_cache.get(project_path) if project_cache else None
+    if relative_paths is None:
+        if parsing:
+            relative_paths = parsing.result()
+        elif is_file_available(project_path):
+            relative_paths = used_media_in_project(project_path)
+        else:
+            return None
+        if project_cache:
+            project_cache.put(project_path, relative_paths)
+
     full_paths = [resolve_relative_path(project_path.parent, r) for r in relative_paths]
 
     return full_paths
@@ -139,70 +206,85 @@ def compare_used(files_df:Path, parent_folder:Path, year:int, full_paths:list[Pa
     return files_used_df
     
 def summarize_folders(engine:Engine, one_drive_folder:Path, media_type:str, review_folder:Path, review_string:str,
-                      ui:SplitConsole, dry_run:bool=False):
+                      ui:SplitConsole, dry_run:bool=False, cache_folder:Path|None=None):
     files = []
     files_used = []
     folders = []
+    scanned_paths = [] # what the folder and file rows were built from, for a dry run's plan
+    project_paths = []
 
+    add_file_columns(engine)
     previously_scanned = fetch_files_scanned(engine, media_type)
+    project_cache = SignatureCache(cache_folder / 'prproj_used.json' if cache_folder else None)
 
-    year_folders = get_year_folders(one_drive_folder)
+    year_folders = sort_paths(get_year_folders(one_drive_folder))
+
+    # parse every year's projects in the background while the folders are scanned
+    premiere_projects = {int(y.name): get_premiere_projects_in_folder(review_folder / f'{review_string} {int(y.name)}')
+                         for y in year_folders}
+    pool = ProcessPoolExecutor()
+    try:
+        parsing = parse_projects(pool, [p for projects in premiere_projects.values() for p in projects], project_cache)
 
-    for year_folder in sort_paths(year_folders):
-        ui.add_update(f'Checking {media_type} {year_folder}')
-        project_year = int(year_folder.name)
+        for year_folder in year_folders:
+            ui.add_update(f'Checking {media_type} {year_folder}')
+            project_year = int(year_folder.name)
 
-        ##### for debugging only 2025
-        # # if project_year >= 2005:
-        # #     continue
+            ##### for debugging only 2025
+            # # if project_year >= 2005:
+            # #     continue
                
-        # look at root folder and subfolders
-        for person_folder in [year_folder] + sort_paths(get_person_folders(year_folder)):
-            ui.set_status(f'Looking at {person_folder}')
+            # look at root folder and subfolders
+            for person_folder in [year_folder] + sort_paths(get_person_folders(year_folder)):
+                ui.set_status(f'Looking at {person_folder}')
 
-            is_root = person_folder == year_folder
-            folder_name = person_folder.name if not is_root else None
+                is_root = person_folder == year_folder
+                folder_name = person_folder.name if not is_root else None
 
-            fo_df = DataFrame(data=[[folder_name, project_year]],
-                              columns=['folder_name', 'project_year'])
+                fo_df = DataFrame(data=[[folder_name, project_year]],
+                                  columns=['folder_name', 'project_year'])
 
-            video_files = get_videos_in_folder(person_folder, recursive=(not is_root)) # don't look recursively if at top level
-            if len(video_files):
+                video_files = get_videos_in_folder(person_folder, recursive=(not is_root)) # don't look recursively if at top level
+                if len(video_files):
 
-                # look at videos
-                scanned_df = previously_scanned[(previously_scanned['folder_name'] == folder_name) & 
-                                (previously_scanned['project_year'] == project_year)]
+                    # look at videos
+                    scanned_df = previously_scanned[(previously_scanned['folder_name'] == folder_name) & 
+                                    (previously_scanned['project_year'] == project_year)]
                 
-                # # if 2000 <= project_year <= 2006:
-                # #     scanned_df = DataFrame(columns=previously_scanned.columns)
-                # # else:
-                # #     scanned_df = previously_scanned[(previously_scanned['folder_name'] == folder_name) & 
-                # #                                     (previously_scanned['project_year'] == project_year)]
-
-                fi_df = summarize_files(person_folder, is_root, project_year, video_files, scanned_df)
-                folders.append(fo_df)
-                if not fi_df.empty:
-                    files.append(fi_df)
-
-        # prepare Premiere Project
-        media_files:list[Path] = []
-
-        project_folder = review_folder / f'{review_string} {project_year}'
-        premiere_projects = get_premiere_projects_in_folder(project_folder)
-        for project_path in premiere_projects:
-            project_available = is_file_available(project_path)
-
-            if project_available:
+                    # # if 2000 <= project_year <= 2006:
+                    # #     scanned_df = DataFrame(columns=previously_scanned.columns)
+                    # # else:
+                    # #     scanned_df = previously_scanned[(previously_scanned['folder_name'] == folder_name) & 
+                    # #                                     (previously_scanned['project_year'] == project_year)]
+
+                    fi_df = summarize_files(person_folder, is_root, project_year, video_files, scanned_df)
+                    scanned_paths.extend([person_folder] + [v.parent for v in video_files] + video_files)
+                    folders.append(fo_df)
+                    if not fi_df.empty:
+                        files.append(fi_df)
+
+            # prepare Premiere Project
+            media_files:list[Path] = []
+
+            for project_path in premiere_projects[project_year]:
                 ui.set_status(f'Getting media used for {project_path.name}')
-                media_files.extend(check_files_used(project_path))
-        media_files = list(set(media_files))
+                used_paths = check_files_used(project_path, project_cache, parsing.get(project_path))
+                if used_paths is not None:
+                    media_files.extend(used_paths)
+                    project_paths.append(project_path)
+            media_files = list(set(media_files))
 
-        if len(media_files):
-            files_df = fetch_files(engine, project_year, media_type)
-            fs_df = compare_used(files_df, year_folder, project_year, media_files)
+            if len(media_files):
+                files_df = fetch_files(engine, project_year, media_type)
+                fs_df = compare_used(files_df, year_folder, project_year, media_files)
 
-            if not fs_df.empty:
-                files_used.append(fs_df)
+                if not fs_df.empty:
+                    files_used.append(fs_df)
+
+    finally:
+        # workers don't outlive a failed scan, and whatever was parsed is kept
+        pool.shutdown(cancel_futures=True)
+        project_cache.save()
 
     if not dry_run:
         if len(folders):
@@ -219,6 +301,21 @@ def summarize_folders(engine:Engine, one_drive_folder:Path, media_type:str, revi
             files_used_df = concat(files_used)
             files_df['media_type'] = media_type
             update_files_used(engine, files_used_df)
+
+    else:
+        if len(folders):
+            folders_df = concat(folders)
+            folders_df['media_type'] = media_type
+            record_db('update_folders', folders_df, scanned_paths)
+
+        if len(files):
+            files_df = concat(files)
+            files_df['media_type'] = media_type
+            record_db('update_files', files_df.drop(columns='full_path'), scanned_paths)
+
+        if len(files_used):
+            files_used_df = concat(files_used)
+            record_db('update_files_used', files_used_df[['file_id', 'used_status']], project_paths)
         
 def update_database_images(engine:Engine, cloud_name:str, api_key:str, api_secret:str, dry_run=False):
     configure_cloud(cloud_name, api_key, api_secret)
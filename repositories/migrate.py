@@ -1,16 +1,20 @@
 '''Scan and copy new videos from Google Drive to OneDrive.'''
 
+import os
 import sys
 from pathlib import Path
-import shutil
-from itertools import combinations
+from collections import defaultdict
 
 from pandas import DataFrame
 from sqlalchemy import Engine
 
+from common.transfer import copy_files, move_file
 from common.system import (get_shortcuts_in_folder, resolve_shortcut_target, mount_g_drive, sort_paths,
                             get_videos_in_folder, get_year_folders, get_person_folders, rebuild_path)
-from database.db_project import fetch_duplicates
+from common.hashing import content_hash, HashIndex
+from common.fingerprint import FingerprintIndex, UNREADABLE
+from common.journal import record_copies, record_move
+from database.db_project import fetch_duplicates, fetch_hash_duplicates, fetch_fingerprints
 
 def gather_names_casefold(folder: Path) -> set[str]:
     """Set of existing filenames (casefolded) in a folder (non-recursive)."""
@@ -21,64 +25,112 @@ def gather_names_casefold(folder: Path) -> set[str]:
                 names.add(p.name.casefold())
     return names
 
-def copy_if_needed(source_file: Path, destination_folder:Path, existing_videos: list[Path], dry_run: bool) -> bool:
+def index_destination(*folders:Path) -> set[str]:
+    """Casefolded names of the videos already in the folders (recursive)."""
+    index = set()
+    for folder in folders:
+        for p in get_videos_in_folder(folder, recursive=True):
+            index.add(p.name.casefold())
+    return index
+
+def queue_if_needed(source_file: Path, destination_folder:Path, existing_videos: set[str],
+                    copy_queue: list[tuple[Path, Path]]) -> bool:
     """
-    Copy file if a case-insensitive filename does not already exist in dst_folder.
-    Returns True if a copy will/does happen, False otherwise.
+    Queue a copy if a case-insensitive filename does not already exist in dst_folder.
+    The name is claimed right away so a second source with the same name isn't queued too.
     """
-    if source_file.name.casefold() in existing_videos:
+    name = source_file.name.casefold()
+    if name in existing_videos:
         return False
-    if dry_run:
-        return True
 
-    destination_folder.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(source_file, destination_folder / source_file.name)
+    existing_videos.add(name)
+    copy_queue.append((source_file, destination_folder / source_file.name))
     return True
 
-def are_dupes(file_1:Path, file_2:Path, byte_threshold=50000) -> Path|None:
-    # check that extensions are the same
-    if file_1.suffix.lower() == file_2.suffix.lower():
-
-        # check that one stem is contained in the other
-        stem_1 = file_1.stem
-        stem_2 = file_2.stem
-
-        contains_1 = stem_1 in stem_2
-        contains_2 = stem_2 in stem_1
-        if contains_1 or contains_2:
+def pick_dupe(file_1:Path, stat_1:os.stat_result, file_2:Path, stat_2:os.stat_result) -> Path:
+    # check which has the longer name
+    len_1 = len(file_1.name)
+    len_2 = len(file_2.name)
 
-            # check that they are roughly the same size
-            stat_1 = file_1.stat()
-            stat_2 = file_2.stat()
-            if abs(stat_1.st_size - stat_2.st_size) <= byte_threshold:
+    if len_1 > len_2:
+        return file_1
+    elif len_2 > len_1:
+        return file_2
 
-                # check which has the longer name
-                len_1 = len(file_1.name)
-                len_2 = len(file_2.name)
-
-                if len_1 > len_2:
-                    return file_1
-                elif len_2 > len_1:
-                    return file_2
+    else:
+        # check which is in a deeper subfolder
+        depth_1 = len(file_1.parts)
+        depth_2 = len(file_2.parts)
+        if depth_1 > depth_2:
+            return file_1
+        elif depth_2 > depth_1:
+            return file_2
 
+        else:
+            # check which ws modified later
+            return file_1 if stat_1.st_mtime > stat_2.st_mtime else file_2
+
+def find_dupes(files:list[Path], byte_threshold=50000) -> list[Path]:
+    ''' Same extension, one stem inside the other and within byte_threshold in size; the copy to drop from each pair '''
+    # stat each file once and bucket by extension
+    by_ext: dict[str, list[tuple[int, Path, os.stat_result]]] = defaultdict(list)
+    for f in files:
+        stat = f.stat()
+        by_ext[f.suffix.lower()].append((stat.st_size, f, stat))
+
+    dupes = {}
+    for candidates in by_ext.values():
+        # sorted by size, so each file only looks ahead until the size gap is too big
+        candidates.sort(key=lambda x: x[0])
+        for i, (size_1, file_1, stat_1) in enumerate(candidates):
+            for j in range(i + 1, len(candidates)):
+                size_2, file_2, stat_2 = candidates[j]
+                if size_2 - size_1 > byte_threshold:
+                    break
+
+                stem_1 = file_1.stem
+                stem_2 = file_2.stem
+                if stem_1 in stem_2 or stem_2 in stem_1:
+                    dupes[pick_dupe(file_1, stat_1, file_2, stat_2)] = None
+
+    return list(dupes)
+
+def find_exact_dupes(files:list[Path]) -> list[Path]:
+    ''' Byte-for-byte copies under any name; only files sharing a size get hashed '''
+    by_size: dict[int, list[tuple[Path, os.stat_result]]] = defaultdict(list)
+    for f in files:
+        stat = f.stat()
+        by_size[stat.st_size].append((f, stat))
+
+    dupes = {}
+    for same_size in by_size.values():
+        if len(same_size) > 1:
+            by_hash: dict[str, tuple[Path, os.stat_result]] = {}
+            for f, stat in same_size:
+                file_hash = content_hash(f)
+                if file_hash in by_hash:
+                    kept, kept_stat = by_hash[file_hash]
+                    dupe = pick_dupe(kept, kept_stat, f, stat)
+                    dupes[dupe] = None
+                    if dupe == kept:
+                        by_hash[file_hash] = (f, stat)
                 else:
-                    # check which is in a deeper subfolder
-                    depth_1 = len(file_1.parts)
-                    depth_2 = len(file_2.parts)
-                    if depth_1 > depth_2:
-                        return file_1
-                    elif depth_2 > depth_1:
-                        return file_2
-
-                    else:
-                        # check which ws modified later
-                        return file_1 if stat_1.st_mtime > stat_2.st_mtime else file_2
+                    by_hash[file_hash] = (f, stat)
 
-def quarantine_file(file:Path, quarantine_root:Path) -> Path:
+    return list(dupes)
+
+def quarantine_target(file:Path, quarantine_root:Path) -> Path:
     # recreate the folder structure under quarantine
     rel_path = file.relative_to(file.parents[2])   # adjust depending on structure
+    return quarantine_root / rel_path
+
+def quarantine_target_2(file:Path, incoming_path:Path, quarantine_root:Path) -> Path:
+    # recreate the folder structure under quarantine
+    rel_path = file.relative_to(incoming_path)   # adjust depending on structure
+    return quarantine_root / rel_path
 
-    target = quarantine_root / rel_path
+def quarantine_file(file:Path, quarantine_root:Path) -> Path:
+    target = quarantine_target(file, quarantine_root)
     
     # ensure target directory exists
     target.parent.mkdir(parents=True, exist_ok=True)
@@ -93,16 +145,13 @@ def quarantine_file(file:Path, quarantine_root:Path) -> Path:
         if target.exists():
             print(f'Cannot move file {file} as it is already in quarantine.')
         else:
-            # atomic move (fast, keeps metadata)
-            file.rename(target)
+            # rename if on the same volume (fast, keeps metadata)
+            move_file(file, target)
 
     return target
 
 def quarantine_file_2(file:Path, incoming_path:Path, quarantine_root:Path) -> Path:
-    # recreate the folder structure under quarantine
-    rel_path = file.relative_to(incoming_path)   # adjust depending on structure
-
-    target = quarantine_root / rel_path
+    target = quarantine_target_2(file, incoming_path, quarantine_root)
     
     # ensure target directory exists
     target.parent.mkdir(parents=True, exist_ok=True)
@@ -117,27 +166,25 @@ def quarantine_file_2(file:Path, incoming_path:Path, quarantine_root:Path) -> Pa
         if target.exists():
             print(f'Cannot move file {file} as it is already in quarantine.')
         else:
-            # atomic move (fast, keeps metadata)
-            shutil.move(file, target)
-            #file.rename(target)
+            # rename if on the same volume (fast, keeps metadata)
+            move_file(file, target)
 
     return target
 
 def dedupe_folder_from_incoming(files_in_folder:list[Path], quarantine_root:Path, dry_run:bool) -> list[Path]|None:
     # identify candidates for removal in GDrive
 
-    file_pairings = combinations(files_in_folder, 2)
-    potential_dupes = []
-    for f1, f2 in file_pairings:
-        dupe = are_dupes(f1, f2)
-        if dupe:
-            potential_dupes.append(dupe)
+    potential_dupes = list(dict.fromkeys(find_dupes(files_in_folder) + find_exact_dupes(files_in_folder)))
 
     if not dry_run:
         # move dupes to a quarantine folder
         for dupe in potential_dupes:
             quarantine_file(dupe, quarantine_root)
-            return potential_dupes
+    else:
+        for dupe in potential_dupes:
+            record_move(dupe, quarantine_target(dupe, quarantine_root))
+
+    return potential_dupes
 
 def dedupe_folder_from_db(duplicates_df:DataFrame, one_drive_folder:Path, quarantine_folder:Path,
                           dry_run:bool) -> tuple[list[Path], list[list[Path]]]:
@@ -158,9 +205,51 @@ def dedupe_folder_from_db(duplicates_df:DataFrame, one_drive_folder:Path, quaran
         if not dry_run:
             for d in dupe_paths:
                 quarantine_file_2(d, one_drive_folder, quarantine_folder)
+        else:
+            for d in dupe_paths:
+                record_move(d, quarantine_target_2(d, one_drive_folder, quarantine_folder))
 
     return keep_paths, move_paths
 
+def dedupe_hashes_from_db(hash_dupes_df:DataFrame, one_drive_folder:Path, quarantine_folder:Path,
+                          dry_run:bool) -> tuple[list[Path], list[list[Path]], list[list[Path]]]:
+    # identical content anywhere in the library, first row of each hash is the keeper
+    # copies used in a Premiere project are never moved, since that would break the project's media links
+    keep_paths = []
+    move_paths = []
+    held_paths = []
+    for _, copies in hash_dupes_df.groupby('content_hash', sort=False):
+        file_paths = [rebuild_path(one_drive_folder / str(row['project_year']), row['folder_name'] or '',
+                                   row['subfolder_name'], row['file_name']) for _, row in copies.iterrows()]
+        used = copies['used_status'].fillna(False).astype(bool).tolist()
+        keep_paths.append(file_paths[0])
+        dupe_paths = [f for f, u in zip(file_paths[1:], used[1:]) if not u]
+        move_paths.append(dupe_paths)
+        held_paths.append([f for f, u in zip(file_paths[1:], used[1:]) if u])
+
+        if not dry_run:
+            for d in dupe_paths:
+                quarantine_file_2(d, one_drive_folder, quarantine_folder)
+        else:
+            for d in dupe_paths:
+                record_move(d, quarantine_target_2(d, one_drive_folder, quarantine_folder))
+
+    return keep_paths, move_paths, held_paths
+
+def find_reencoded_dupes(fingerprints_df:DataFrame, one_drive_folder:Path) -> list[tuple[Path, Path, float]]:
+    # pairs of clips whose sampled frames look alike, whatever their bytes
+    fingerprint_index = FingerprintIndex()
+    file_hashes = {}
+    for _, row in fingerprints_df[fingerprints_df['video_fingerprint'] != UNREADABLE].iterrows():
+        file_path = rebuild_path(one_drive_folder / str(row['project_year']), row['folder_name'] or '',
+                                 row['subfolder_name'], row['file_name'])
+        fingerprint_index.add(file_path, row['video_fingerprint'])
+        file_hashes[file_path] = row['content_hash']
+
+    # byte-identical copies are already handled by the content hash
+    return [(f1, f2, distance) for f1, f2, distance in fingerprint_index.near_duplicates()
+            if not file_hashes[f1] or file_hashes[f1] != file_hashes[f2]]
+
 def dedupe_one_drive(engine:Engine, one_drive_folder:Path, media_type:str,
                      quarantine_folder:Path, dry_run:bool):
     # dedupe from before
@@ -170,12 +259,28 @@ def dedupe_one_drive(engine:Engine, one_drive_folder:Path, media_type:str,
     for k, m in zip(keep_paths, move_paths):
         print(f'Kept {k}, moved {m}.')
 
+    # exact copies across folders and years
+    hash_dupes_df = fetch_hash_duplicates(engine, media_type)
+    keep_paths, move_paths, held_paths = dedupe_hashes_from_db(hash_dupes_df, one_drive_folder, quarantine_folder,
+                                                               dry_run=dry_run)
+    for k, m, h in zip(keep_paths, move_paths, held_paths):
+        if m:
+            print(f'Kept {k}, moved identical {m}.')
+        if h:
+            print(f'Kept {k}, left identical {h} in place, used in a Premiere project.')
+
+    # same clip at another size or resolution, flagged for review only
+    for f1, f2, distance in find_reencoded_dupes(fetch_fingerprints(engine, media_type), one_drive_folder):
+        print(f'Possible re-encode: {f1} and {f2} (distance {distance}).')
+
 def copy_from_gdrive(one_drive_folder:Path, google_drive_folder:Path,
-                     quarantine_folder:Path, quarantine:str, ui, dry_run:bool):
+                     quarantine_folder:Path, quarantine:str, ui, dry_run:bool,
+                     workers:int=4, bytes_per_second:int|None=None, hash_index:HashIndex|None=None):
     ''' look at Google Drive folders and copy in new items '''
     mount_g_drive()
 
     google_drive_years = get_year_folders(google_drive_folder)
+    destination_index: dict[Path, set[str]] = {} # per person folder, kept for the whole run
 
     for g_year in google_drive_years:
         o_year = one_drive_folder / g_year.name
@@ -197,6 +302,13 @@ def copy_from_gdrive(one_drive_folder:Path, google_drive_folder:Path,
             shortcut_folders = get_shortcuts_in_folder(g_person) # recursive=True if more than top level
             checkable_folders = [g_person] + [resolve_shortcut_target(s) for s in shortcut_folders if s]
 
+            # what's already in OneDrive or quarantine, walked once per person rather than per shortcut
+            if o_person not in destination_index:
+                destination_index[o_person] = index_destination(o_person, q_person)
+            existing_videos = destination_index[o_person]
+
+            copy_queue: list[tuple[Path, Path]] = []
+            queued_hashes: dict[Path, str] = {}
             for folder in checkable_folders:
                 # see what's in the folder before quarantine
                 video_files = get_videos_in_folder(folder, recursive=True)
@@ -205,18 +317,42 @@ def copy_from_gdrive(one_drive_folder:Path, google_drive_folder:Path,
                 dupes = dedupe_folder_from_incoming(video_files, google_drive_folder / quarantine, dry_run)
 
                 # List candidate videos in the Google Drive person folder (non-recursive).
-                candidate_files = [v for v in video_files if v not in dupes] if dupes else video_files
-            
-                destination_files = get_videos_in_folder(o_person, recursive=True)
-                quarantined_files = get_videos_in_folder(q_person, recursive=True) if q_person.exists() else []
-                existing_videos = [f.name.casefold() for f in set(destination_files + quarantined_files)]
-            
-                copied_count = 0
-                for video_file in candidate_files:
-                    if copy_if_needed(video_file, o_person, existing_videos, dry_run=dry_run):
-                        copied_count += 1
+                dupe_set = set(dupes or [])
+                candidate_files = [v for v in video_files if v not in dupe_set]
 
-                copy_report.append((person_name, copied_count))
+                for video_file in candidate_files:
+                    if hash_index is not None and video_file.name.casefold() not in existing_videos:
+                        # reject content that is already somewhere in the library under another name
+                        queued_hashes[video_file] = file_hash = content_hash(video_file)
+                        if (copy_of := hash_index.find(file_hash)):
+                            ui.add_update(f'Skipping {video_file.name}, identical to {copy_of}')
+                            continue
+
+                    queue_if_needed(video_file, o_person, existing_videos, copy_queue)
+
+            if dry_run:
+                copied_count = len(copy_queue)
+                record_copies(copy_queue)
+            else:
+                def show_progress(n, n_total, b, b_total, person_name=person_name):
+                    ui.set_status(f'Copying {person_name}: {n}/{n_total} videos, '
+                                  f'{b / 1024**2:,.0f}/{b_total / 1024**2:,.0f} MB')
+
+                copied, failed = copy_files(copy_queue, workers=workers, bytes_per_second=bytes_per_second,
+                                            progress=show_progress)
+                for source, e in failed:
+                    # free the name so it can be picked up next run
+                    existing_videos.discard(source.name.casefold())
+                    ui.add_update(f'Could not copy {source}: {e}')
+                copied_count = len(copied)
+
+                if hash_index is not None:
+                    landed = set(copied)
+                    for source, destination in copy_queue:
+                        if source in queued_hashes and destination in landed:
+                            hash_index.add(destination, queued_hashes[source])
+
+            copy_report.append((person_name, copied_count))
 
         # Also include note for any GDrive person folders that do not exist in OneDrive yet (only relevant when dry-run)
         missing_targets = []
@@ -0,0 +1,52 @@
+from pathlib import Path
+from itertools import groupby
+
+from sqlalchemy import Engine
+
+from common.console import SplitConsole
+from common.journal import step_frame
+from common.transfer import copy_files, move_file
+from database.db_project import update_folders, update_files, update_files_used, purge_folders, purge_files
+
+# database writes a plan may contain
+DB_OPERATIONS = {
+    'update_folders': update_folders,
+    'update_files': update_files,
+    'update_files_used': update_files_used,
+    'purge_folders': purge_folders,
+    'purge_files': purge_files,
+    }
+
+def apply_plan(engine:Engine, steps:list[dict], ui:SplitConsole,
+               workers:int=4, bytes_per_second:int|None=None):
+    ''' Carry out a dry run's steps in the order they were planned '''
+    copied_count = moved_count = db_count = 0
+
+    # runs of copies go through the parallel copy engine together
+    for action, group in groupby(steps, key=lambda x: x['action']):
+        group = list(group)
+        match action:
+            case 'copy':
+                jobs = [(Path(s['source']), Path(s['destination'])) for s in group]
+                def show_progress(n, n_total, b, b_total):
+                    ui.set_status(f'Copying {n}/{n_total} videos, {b / 1024**2:,.0f}/{b_total / 1024**2:,.0f} MB')
+                copied, failed = copy_files(jobs, workers=workers, bytes_per_second=bytes_per_second,
+                                            progress=show_progress)
+                for source, e in failed:
+                    ui.add_update(f'Could not copy {source}: {e}')
+                copied_count += len(copied)
+
+            case 'move':
+                for s in group:
+                    ui.set_status(f'Quarantining {Path(s["source"]).name}')
+                    move_file(Path(s['source']), Path(s['destination']))
+                    moved_count += 1
+
+            case 'db':
+                for s in group:
+                    ui.set_status(f'Running {s["operation"]}')
+                    DB_OPERATIONS[s['operation']](engine, step_frame(s))
+                    db_count += 1
+
+    ui.add_update('\n=== Plan Applied ===')
+    ui.add_update(f'{copied_count} copied, {moved_count} quarantined, {db_count} database updates')
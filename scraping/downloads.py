@@ -0,0 +1,301 @@
+'''Download album media straight over HTTP; the browser only signs in and finds the files.'''
+
+import os
+import re
+import json
+import base64
+import hashlib
+import threading
+from pathlib import Path
+from time import monotonic, sleep
+from urllib.parse import unquote, urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from common.transfer import Bandwidth, CHUNK_SIZE, partial_path
+
+TIMEOUT = 60 # seconds to wait on a connection or between chunks
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+IN_PROGRESS_SUFFIX = '.crdownload' # browser downloads carry this until they finish
+QUIET = 5 # seconds without download events before the folder is checked as well
+
+# download events come from the Page domain, or the Browser domain in newer browsers
+DOWNLOAD_BEGIN = ['Page.downloadWillBegin', 'Browser.downloadWillBegin']
+DOWNLOAD_PROGRESS = ['Page.downloadProgress', 'Browser.downloadProgress']
+
+DISPOSITION_NAME = re.compile(r'''filename\*=(?:UTF-8'')?([^;]+)|filename="?([^";]+)"?''', re.I)
+
+# ---------- Browser side
+
+def read_performance_log(driver) -> list[dict]:
+    ''' CDP messages (method, params) logged since the last read; reading empties the log '''
+    return [json.loads(entry['message'])['message'] for entry in driver.get_log('performance')]
+
+def network_responses(messages:list[dict], url_part:str) -> list[dict]:
+    ''' Network.responseReceived params for responses whose URL contains url_part '''
+    return [m['params'] for m in messages
+            if m.get('method') == 'Network.responseReceived' and url_part in m['params']['response']['url']]
+
+def response_json(driver, request_id:str):
+    body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+    text = base64.b64decode(body['body']) if body.get('base64Encoded') else body['body']
+    return json.loads(text)
+
+def session_from_driver(driver, workers:int=4) -> requests.Session:
+    ''' An HTTP session signed in as the browser: its cookies for every domain and its user agent '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers,
+                          max_retries=Retry(total=3, backoff_factor=1, status_forcelist=RETRY_STATUSES,
+                                            allowed_methods=None))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = driver.execute_script('return navigator.userAgent;')
+    for cookie in driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', []):
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie.get('path', '/'))
+    return session
+
+class DownloadTracker:
+    '''
+    Files the browser was asked to download, marked done as each one finishes: from the download events
+    in the driver's performance log, or from one listing of the folder per look when there are none.
+    on_complete(path) is handed each finished file straight away.
+    '''
+    def __init__(self, download_directory:Path, file_names:list[str], driver=None, on_complete=None):
+        self.download_directory = download_directory
+        self.driver = driver
+        self.on_complete = on_complete
+        self.pending = {name.lower() for name in file_names}
+        self.done: list[Path] = []
+        self.failed: list[str] = []
+        self.suggested: dict[str, str] = {} # download guid -> file name
+        self.writing_bytes = 0
+        self.last_event = None
+        self.last_progress = monotonic()
+
+    def match(self, file_name:str) -> str|None:
+        # iCloud Photos names are known without their extension
+        for key in [file_name.lower(), Path(file_name).stem.lower()]:
+            if key in self.pending:
+                return key
+
+    def finish(self, file_path:Path):
+        if (key := self.match(file_path.name)) is None:
+            return
+        self.pending.discard(key)
+        self.done.append(file_path)
+        self.last_progress = monotonic()
+        if self.on_complete:
+            self.on_complete(file_path)
+
+    def read_events(self):
+        for message in read_performance_log(self.driver):
+            method = message.get('method')
+            params = message.get('params', {})
+            if method in DOWNLOAD_BEGIN:
+                self.suggested[params['guid']] = params.get('suggestedFilename', '')
+            elif method in DOWNLOAD_PROGRESS:
+                file_name = self.suggested.get(params['guid'], '')
+                match params.get('state'):
+                    case 'completed':
+                        if file_name and (self.download_directory / file_name).is_file():
+                            self.finish(self.download_directory / file_name)
+                    case 'canceled':
+                        if (key := self.match(file_name)) is not None:
+                            self.pending.discard(key)
+                            self.failed.append(file_name)
+                self.last_progress = monotonic()
+            else:
+                continue
+            self.last_event = monotonic()
+
+    def scan_folder(self):
+        ''' Finished files are the ones that have dropped the in-progress suffix '''
+        if not self.download_directory.exists():
+            return
+        writing_bytes = 0
+        with os.scandir(self.download_directory) as entries:
+            files = [entry for entry in entries if entry.is_file()]
+        names = {entry.name for entry in files}
+        for entry in files:
+            if entry.name.endswith(IN_PROGRESS_SUFFIX):
+                writing_bytes += entry.stat().st_size
+            elif entry.name + IN_PROGRESS_SUFFIX not in names:
+                # a name with its .crdownload still beside it is a placeholder the browser is about to replace
+                self.finish(Path(entry.path))
+        if writing_bytes != self.writing_bytes:
+            self.writing_bytes = writing_bytes
+            self.last_progress = monotonic()
+
+    def poll(self) -> bool:
+        ''' Take in whatever finished since the last look; True once nothing is pending '''
+        if self.driver is not None:
+            self.read_events()
+        # the folder backs up the events: before any arrive, and if they stop short of a file
+        if self.pending and (self.last_event is None or monotonic() - self.last_event > QUIET):
+            self.scan_folder()
+        return not self.pending
+
+    def wait(self, timeout:float=300, interval:float=0.3) -> bool:
+        ''' Until every file is done, or timeout seconds pass without progress; False if any didn't finish '''
+        while not self.poll():
+            if monotonic() - self.last_progress > timeout:
+                return False
+            sleep(interval)
+        return not self.failed
+
+# ---------- HTTP side
+
+def filename_from_response(response:requests.Response, url:str) -> str:
+    if (found := DISPOSITION_NAME.search(response.headers.get('Content-Disposition', ''))):
+        return Path(unquote((found.group(1) or found.group(2)).strip())).name
+    return Path(unquote(urlparse(url).path)).name
+
+def is_known(file_name:str, known_files:set[str]) -> bool:
+    # iCloud Photos names are known without their extension
+    return file_name.lower() in known_files or Path(file_name).stem.lower() in known_files
+
+def expected_md5(response:requests.Response) -> str|None:
+    ''' Whole-file MD5 from Content-MD5 or Google's x-goog-hash, as hex '''
+    for header in [response.headers.get('Content-MD5', '')] + response.headers.get('x-goog-hash', '').split(','):
+        header = header.strip().removeprefix('md5=')
+        if header and '=' not in header.rstrip('='):
+            try:
+                digest = base64.b64decode(header)
+            except ValueError:
+                continue
+            if len(digest) == 16:
+                return digest.hex()
+
+def file_md5(file_path:Path) -> str:
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        while (chunk := f.read(CHUNK_SIZE)):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def claim_destination(download_directory:Path, file_name:str, claimed:set[str], lock) -> Path:
+    '''
+    A name in download_directory that no other job in this run is writing to and no file has,
+    numbered the way the browser does (IMG_1234 (1).MOV) when two album items share a name.
+    '''
+    stem, suffix = Path(file_name).stem, Path(file_name).suffix
+    candidate = file_name
+    with lock:
+        n = 0
+        while candidate.lower() in claimed or (download_directory / candidate).exists():
+            n += 1
+            candidate = f'{stem} ({n}){suffix}'
+        claimed.add(candidate.lower())
+    return download_directory / candidate
+
+def download_media(session:requests.Session, url:str, download_directory:Path, known_files:set[str],
+                   expected_size:int|None=None, bandwidth:Bandwidth|None=None,
+                   claimed:set[str]|None=None, lock=None) -> tuple[str, bool]:
+    '''
+    Stream one file into download_directory through a .partial file, resuming one left by an earlier
+    run with a Range request, then check its size (and MD5 when the server sends one) before renaming.
+    Jobs running side by side share claimed (under lock), so each writes to its own name.
+    Returns the file name and whether it was downloaded (False when already known).
+    '''
+    response = session.get(url, stream=True, timeout=TIMEOUT)
+    try:
+        response.raise_for_status()
+        file_name = filename_from_response(response, url)
+        if is_known(file_name, known_files):
+            return file_name, False
+
+        if claimed is not None:
+            destination = claim_destination(download_directory, file_name, claimed, lock)
+        else:
+            destination = download_directory / file_name
+        file_name = destination.name
+        partial = partial_path(destination)
+        offset = partial.stat().st_size if partial.exists() else 0
+        total = expected_size or int(response.headers.get('Content-Length', 0)) or None
+        md5 = expected_md5(response)
+
+        if total and offset > total:
+            # not this file's bytes, so start over
+            offset = 0
+
+        # a partial already at full size was finished by an earlier run that stopped before the rename
+        if not (total and offset == total):
+            if offset:
+                response.close()
+                response = session.get(url, stream=True, timeout=TIMEOUT, headers={'Range': f'bytes={offset}-'})
+                response.raise_for_status()
+                if response.status_code != 206:
+                    # the server ignored the range, so start over
+                    offset = 0
+
+            download_directory.mkdir(parents=True, exist_ok=True)
+            with open(partial, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    if bandwidth:
+                        bandwidth.consume(len(chunk))
+    finally:
+        response.close()
+
+    size = partial.stat().st_size
+    if total and size != total:
+        # left in place for the next run to resume
+        raise OSError(f'{file_name} stopped at {size:,} of {total:,} bytes')
+    if md5 and file_md5(partial) != md5:
+        partial.unlink()
+        raise OSError(f'{file_name} does not match its checksum')
+
+    os.replace(partial, destination)
+    return file_name, True
+
+def download_all(session:requests.Session, jobs:list[dict], download_directory:Path, known_files:list[str],
+                 workers:int=4, bandwidth:Bandwidth|None=None, progress=None) -> tuple[list[str], list[tuple[str, Exception]]]:
+    '''
+    Download every job ({'url', optional 'size'}) on a pool sharing the session's connections.
+    progress(file_name, downloaded) is called from the calling thread as each one finishes.
+    Returns the names downloaded and the (url, error) of each that failed.
+    '''
+    known = {f.lower() for f in known_files}
+    claimed = set()
+    lock = threading.Lock()
+    downloaded = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(download_media, session, job['url'], download_directory, known,
+                               job.get('size'), bandwidth, claimed, lock): job['url'] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                file_name, was_downloaded = future.result()
+            except (requests.RequestException, OSError) as e:
+                failed.append((futures[future], e))
+                continue
+
+            if was_downloaded:
+                downloaded.append(file_name)
+            if progress:
+                progress(file_name, was_downloaded)
+
+    return downloaded, failed
+
+def fetch_album_videos(driver, jobs:list[dict], download_directory:Path, known_files:list[str], workers:int=4,
+                       bandwidth:Bandwidth|None=None, dry_run=False) -> tuple[list[str], list[str]]:
+    ''' Download an album's videos with the browser's sign-in; returns the names downloaded and the URLs that failed '''
+    if dry_run:
+        print(f'Dry run only, {len(jobs)} videos would be checked for download.')
+        return [], []
+
+    def show_progress(file_name, downloaded):
+        print(f'Downloaded {file_name}' if downloaded else f'Already downloaded {file_name}, skipping.')
+
+    session = session_from_driver(driver, workers)
+    downloaded_files, failed = download_all(session, jobs, download_directory, known_files, workers=workers,
+                                            bandwidth=bandwidth, progress=show_progress)
+    for url, e in failed:
+        print(f'Could not download {url}: {e}')
+    session.close()
+
+    return downloaded_files, [url for url, _ in failed]
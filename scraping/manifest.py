@@ -0,0 +1,19 @@
+'''What an album held at its last harvest, to tell unchanged albums apart without walking them.'''
+
+MANIFEST_ITEMS = 10 # identifiers kept from the top of each album
+
+def make_listing(item_count:int|None, item_ids:list[str]) -> dict|None:
+    ''' An album's item count and leading item identifiers as the page shows them now '''
+    item_ids = [i for i in item_ids if i][:MANIFEST_ITEMS]
+    if item_count is not None and (item_ids or not item_count):
+        return {'item_count': item_count, 'item_ids': item_ids}
+
+def is_unchanged(manifest:dict|None, listing:dict|None) -> bool:
+    ''' Same count and same leading items as last time; anything unreadable counts as changed '''
+    if not (manifest and listing):
+        return False
+    if manifest['item_count'] != listing['item_count']:
+        return False
+    # every stored identifier has to be there again, in the same order
+    stored = manifest['item_ids']
+    return listing['item_ids'][:len(stored)] == stored
@@ -1,4 +1,4 @@
-import time, os, re
+import time, os, re, shutil
 from datetime import datetime
 from pathlib import Path
 
@@ -8,9 +8,15 @@ from selenium.webdriver.chrome.options import Options as ChromeOptions
 
 from common.structure import CHROME_DATA, CHROME_STATE, EDGE_EXE, EDGE_DATA, EDGE_STATE
 from common.system import close_exe
+from common.transfer import Bandwidth
+from scraping.downloads import DownloadTracker
 from scraping.photos_google import harvest_g_shared_album
 from scraping.photos_icloud import harvest_i_shared_album
 
+# profile folders a cloned profile can do without: caches are large, locked while the browser runs and rebuilt
+PROFILE_SKIP = ['Cache', 'Code Cache', 'GPUCache', 'DawnCache', 'DawnGraphiteCache', 'DawnWebGPUCache',
+                'GrShaderCache', 'GraphiteDawnCache', 'ShaderCache', 'Service Worker', 'blob_storage', 'Crashpad']
+
 def get_browser_profiles(browser: str):
     BROWSER_STATE = {'chrome': CHROME_STATE, 'edge': EDGE_STATE}[browser]
     
@@ -24,15 +30,49 @@ def get_browser_profile(browser: str, name: str) -> str:
     browser_profile = browser_profiles.get(name, 'Default')
     return browser_profile
 
+def get_profile_directory(browser: str, name: str) -> str|None:
+    ''' The profile's directory name, whether name is already one or is a display name; None if neither. '''
+    browser_data = {'chrome': CHROME_DATA, 'edge': EDGE_DATA}[browser]
+    if name and (browser_data / name).is_dir():
+        return name
+    return get_browser_profiles(browser).get(name)
+
+def clone_profile(browser: str, name: str, clone_root: Path) -> Path:
+    '''
+    Copy one browser profile (without caches) and Local State into its own user data folder,
+    since a user data folder can only be open in one browser at a time. Returns the folder.
+    '''
+    browser_data = {'chrome': CHROME_DATA, 'edge': EDGE_DATA}[browser]
+    browser_profile = get_profile_directory(browser, name)
+    if browser_profile is None:
+        # a clone of another profile would open signed out and every album would look missing
+        raise ValueError(f'No {browser} profile {name} to copy')
+    user_data_dir = clone_root / f'{browser} {browser_profile}'
+    try:
+        shutil.copytree(browser_data / browser_profile, user_data_dir / browser_profile,
+                        ignore=shutil.ignore_patterns(*PROFILE_SKIP), dirs_exist_ok=True)
+    except shutil.Error as e:
+        # files held open by a running browser; sign-in cookies usually still come across
+        print(f'Some of profile {name} could not be copied ({len(e.args[0])} files).')
+    shutil.copy2(browser_data / 'Local State', user_data_dir / 'Local State')
+    return user_data_dir
+
+def close_stale_browsers(browsers: list[str]):
+    ''' Close leftover Edge instances before any driver starts, since they hold its profile '''
+    if 'edge' in [b.lower() for b in browsers]:
+        close_exe(EDGE_EXE)
+
 # ---------- Selenium / browser setup ----------
 
 def make_driver(headless: bool = True, download_directory: Path|None = None, browser_profile='',
-                browser='edge') -> webdriver.Chrome|webdriver.Edge|None:
+                browser='edge', user_data_dir: Path|None = None,
+                close_stale=True) -> webdriver.Chrome|webdriver.Edge|None:
     browser = browser.lower()
     if browser not in ['chrome', 'edge']:
         return
 
-    browser_profile = get_browser_profile(browser, browser_profile)
+    # the same directory clone_profile copied, when running from a clone
+    browser_profile = get_profile_directory(browser, browser_profile) or 'Default'
 
     match browser:
         case 'chrome':
@@ -41,7 +81,7 @@ def make_driver(headless: bool = True, download_directory: Path|None = None, bro
             opts = EdgeOptions()
  
     BROWSER_DATA = {'chrome': CHROME_DATA, 'edge': EDGE_DATA}[browser]
-    opts.add_argument(f'--user-data-dir={BROWSER_DATA}')
+    opts.add_argument(f'--user-data-dir={user_data_dir or BROWSER_DATA}')
     opts.add_argument(f'--profile-directory={browser_profile}')
 
     if headless:
@@ -77,46 +117,40 @@ def make_driver(headless: bool = True, download_directory: Path|None = None, bro
         driver = webdriver.Chrome(options=opts)
         
     elif browser == 'edge':
-        close_exe(EDGE_EXE) # ensure no stale Edge instances
+        if close_stale:
+            close_exe(EDGE_EXE) # ensure no stale Edge instances
         driver = webdriver.Edge(options=opts)
 
     # Enable CDP Network (lets us fetch response bodies if needed)
     driver.execute_cdp_cmd('Network.enable', {})
+    set_download_directory(driver, download_directory)
+    return driver
+
+def set_download_directory(driver, download_directory: Path|None):
+    ''' Point a running driver's downloads at another folder, so one driver can serve many albums '''
     driver.execute_cdp_cmd('Page.setDownloadBehavior',
                            {'behavior': 'allow',
                             'downloadPath': os.path.abspath(download_directory or os.getcwd())})
-    return driver
+
+def limit_bandwidth(driver, bytes_per_second: int|None):
+    ''' Throttle a driver's downloads to its share of the harvest's bandwidth cap '''
+    if bytes_per_second:
+        driver.execute_cdp_cmd('Network.emulateNetworkConditions',
+                               {'offline': False, 'latency': 0,
+                                'downloadThroughput': bytes_per_second, 'uploadThroughput': -1})
 
 # ---------- Helper for download control ----------
 
-def wait_for_expected_downloads(download_directory: Path,
-                                expected_filenames: list[str],
-                                timeout: int = 300,
-                                poll: float = 0.3) -> bool:
-    """
-    Wait until every expected filename exists in download_dir
-    and its .crdownload temp file is gone.
-    """
-    end = time.time() + timeout
-    expected = [Path(download_directory, name) for name in expected_filenames]
-
-    while time.time() < end:
-        all_done = True
-        for target in expected:
-            # exists and not a temp file still in progress
-            suffix = target.suffix if target.suffix != '' else '.*' ## iCloud Photos doesn't say the extension before downloading
-            temp = target.with_suffix(suffix + ".crdownload")
-            if not target.exists() or temp.exists():
-                all_done = False
-                break
-
-        if all_done:
-            return True
-
-        print('Waiting for downloads...')
-        time.sleep(poll)
-
-    return False
+def wait_for_expected_downloads(download_directory: Path, expected_filenames: list[str], driver=None,
+                                on_complete=None, timeout: int = 300) -> bool:
+    '''
+    Wait until every expected file has finished downloading into download_directory, handing each to
+    on_complete as it lands. Gives up after timeout seconds without progress.
+    '''
+    tracker = DownloadTracker(download_directory, expected_filenames, driver=driver, on_complete=on_complete)
+    if not tracker.poll():
+        print(f'Waiting for {len(tracker.pending)} downloads to finish...')
+    return tracker.wait(timeout=timeout)
 
 # ---------- Main block ----------
 
@@ -131,31 +165,51 @@ def source_allowed(source_name, google=False, icloud=False):
 
 def harvest_shared_album(shared_album_url:str, download_directory:Path,
                          scrape_name: str, browser_name, browser_profile: str|None = None,
-                         headless=True, dry_run=False):
-
-    # create Edge driver
-    driver = make_driver(headless=headless, browser=browser_name, browser_profile=browser_profile, download_directory=download_directory)
+                         headless=True, dry_run=False, driver=None, workers=4, bandwidth: Bandwidth|None = None,
+                         manifest: dict|None = None, on_complete=None):
+    '''
+    Download an album's new videos, skipping it when it still matches manifest from the last harvest.
+    on_complete(path) is handed each downloaded file as soon as it is finished.
+    Returns the names downloaded (None when skipped) and the listing to record for next time, if it can be trusted.
+    '''
+
+    # create Edge driver, unless the scheduler lends one that stays open between albums
+    own_driver = driver is None
+    if own_driver:
+        driver = make_driver(headless=headless, browser=browser_name, browser_profile=browser_profile, download_directory=download_directory)
+    else:
+        set_download_directory(driver, download_directory)
 
     downloaded_files = None
+    listing = None
 
     shared_album_url = shared_album_url.strip().rstrip('/') # remove ending /
 
     match scrape_name.lower():
         case 'google':
             # get videos from Google Photos
-            downloaded_files = harvest_g_shared_album(driver, download_directory, shared_album_url, dry_run=dry_run)
+            downloaded_files, listing = harvest_g_shared_album(driver, download_directory, shared_album_url,
+                                                               dry_run=dry_run, workers=workers, bandwidth=bandwidth,
+                                                               manifest=manifest)
         case 'icloud':
             # get videos from iCloud Photos
-            downloaded_files = harvest_i_shared_album(driver, download_directory, shared_album_url, dry_run=dry_run)
+            downloaded_files, listing = harvest_i_shared_album(driver, download_directory, shared_album_url,
+                                                               dry_run=dry_run, workers=workers, bandwidth=bandwidth,
+                                                               manifest=manifest)
    
     if downloaded_files:
         # ... you triggered downloads ...
-        if not wait_for_expected_downloads(download_directory, downloaded_files):
+        if not wait_for_expected_downloads(download_directory, downloaded_files, driver=driver,
+                                           on_complete=on_complete):
             print("[warn] downloads may still be in progress or timed out")
+            listing = None
         # now safe to close
 
         n_downloads = len(downloaded_files)
         v_s = '' if n_downloads == 1 else 's'
         print(f'Downloaded {n_downloads} new file{v_s} to {download_directory}:')
 
-    driver.quit()
+    if own_driver:
+        driver.quit()
+
+    return downloaded_files, (None if dry_run else listing)
@@ -1,3 +1,4 @@
+import re
 from time import sleep
 from pathlib import Path
 
@@ -9,6 +10,9 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.remote.webdriver import WebDriver
 
 from common.system import get_videos_in_folder
+from common.transfer import Bandwidth
+from scraping.downloads import fetch_album_videos
+from scraping.manifest import make_listing, is_unchanged
 
 G_SUMMARY_CLASS = 'Fbw5bb'
 G_SUMMARY_ITEM = 'items'
@@ -20,6 +24,33 @@ G_ANCHOR_CLASS = 'p137Zd'
 G_FILENAME_CLASS = 'R9U8ab'
 G_FILENAME_ARIA_LABEL = 'Filename'
 
+G_CONTENT_HOST = 'googleusercontent.com'
+G_ORIGINAL_VIDEO = '=dv' # appended to a tile's base URL, downloads the original video
+
+# empty scroll steps allowed while the next batch of tiles loads
+SCROLL_RETRIES = 3
+SCROLL_SETTLE = 0.5
+
+# every loaded tile's (href, first word of aria-label, content base URL) in one round trip,
+# then bring the last tile to the top so the next batch loads
+_TILE_SCRIPT = '''
+const [itemClass, anchorClass, contentHost, scroll] = arguments;
+const tiles = document.querySelectorAll('div.' + itemClass);
+const values = [];
+for (const tile of tiles) {
+    const anchor = tile.querySelector('.' + anchorClass);
+    const href = anchor && anchor.href;
+    const label = anchor && (anchor.getAttribute('aria-label') || '').trim().split(/\\s+/)[0];
+    // thumbnails are the base URL plus sizing options after '='
+    const thumb = tile.querySelector(`img[src*="${contentHost}"], [style*="${contentHost}"]`);
+    const source = thumb ? (thumb.getAttribute('src') || thumb.getAttribute('style') || '') : '';
+    const base = (source.match(/https:\\/\\/[^"')\\s]+?(?==|["')\\s]|$)/) || [''])[0];
+    if (href && label) values.push([href, label, base.includes(contentHost) ? base : '']);
+}
+if (scroll && tiles.length) tiles[tiles.length - 1].scrollIntoView({block: 'start'});
+return values;
+'''
+
 # ---------- Helper for scrolling ----------
 
 def check_404(driver, timeout=2) -> bool:
@@ -32,14 +63,32 @@ def check_404(driver, timeout=2) -> bool:
 
     return text_check
 
-def scroll_once(driver: WebDriver):
-    ''' Scrolls to last visible tile to dynamically load more. '''    
-    tiles = get_visible_item_tiles(driver)
-    actions = ActionChains(driver)
-    actions.scroll_to_element(tiles[-1]).perform()
+def read_tiles_and_scroll(driver: WebDriver, scroll=True) -> list[tuple[str, str, str]]:
+    ''' All loaded tiles' share links, types and content URLs, scrolling on to load more, in one call. '''
+    return [tuple(v) for v in driver.execute_script(_TILE_SCRIPT, G_ITEM_CLASS, G_ANCHOR_CLASS, G_CONTENT_HOST,
+                                                    scroll) or []]
 
 # ---------- Helpers: navigating pages ----------
 
+def get_item_count(driver: WebDriver) -> int|None:
+    ''' The album's item count from its summary line, eg "Jun 3 – Aug 12 · 87 items" '''
+    for element in driver.find_elements(By.CSS_SELECTOR, f'div.{G_SUMMARY_CLASS}'):
+        if (found := re.search(rf'([\d,]+)\s+{G_SUMMARY_ITEM.removesuffix("s")}', element.text or '', flags=re.I)):
+            return int(found.group(1).replace(',', ''))
+
+def get_listing(driver: WebDriver) -> dict|None:
+    ''' Item count and first tiles' share links, without scrolling '''
+    item_count = get_item_count(driver)
+    tile_values = read_tiles_and_scroll(driver, scroll=False)
+    for _ in range(SCROLL_RETRIES):
+        if tile_values or not item_count:
+            break
+        # the summary can render before the first tiles
+        sleep(SCROLL_SETTLE)
+        tile_values = read_tiles_and_scroll(driver, scroll=False)
+
+    return make_listing(item_count, [t[0] for t in tile_values])
+
 def get_gallery(driver: WebDriver, timeout: int = 15):
     ''' Wait for the outer album grid container to appear. '''
     WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, f'div.{G_GALLERY_CLASS}')))
@@ -51,28 +100,23 @@ def get_visible_item_tiles(driver: WebDriver):
 
 def get_all_item_tiles(driver: WebDriver):
     ''' Gets every item tile and scrolls to load more '''
-    tile_values = []
+    tile_values = {} # insertion-ordered set of (href, label, base URL)
     gallery = get_gallery(driver)
 
     if gallery:
-        all_found = False
-        while not all_found:
-            tiles = get_visible_item_tiles(driver)
-
-            new_values = [(href, label) for t in tiles if \
-                            (alist := t.find_element(By.CLASS_NAME, G_ANCHOR_CLASS)) and \
-                            (href := alist.get_attribute('href')) and \
-                            (label := alist.get_attribute('aria-label').split()[0]) and \
-                            ((href, label) not in tile_values)]
-            if len(new_values):
-                tile_values.extend(new_values)
-                ## Scroll to bottom to load more
-                scroll_once(driver)  
+        empty_steps = 0
+        while empty_steps < SCROLL_RETRIES:
+            n_found = len(tile_values)
+            tile_values.update(dict.fromkeys(read_tiles_and_scroll(driver)))
 
+            if len(tile_values) > n_found:
+                empty_steps = 0
             else:
-                all_found = True
+                # nothing new yet, give the next batch a moment to render
+                empty_steps += 1
+                sleep(SCROLL_SETTLE)
 
-    return tile_values
+    return list(tile_values)
 
 def get_share_video_urls(tile_values):
     ''' Get share urls of all video tiles '''
@@ -115,15 +159,28 @@ def inspect_and_download(driver:WebDriver, known_files:list=[], timeout=15, dry_
 
 # ---------- Main block ----------
 
-def harvest_g_shared_album(driver: WebDriver, download_directory: Path, shared_album_url: str, dry_run=False):
+def harvest_g_shared_album(driver: WebDriver, download_directory: Path, shared_album_url: str, dry_run=False,
+                           workers=4, bandwidth: Bandwidth|None=None, manifest: dict|None=None):
+    '''
+    Download an album's new videos, unless its count and leading items match manifest from the last harvest.
+    Returns the names downloaded and the album's listing to record once they are safely in.
+    '''
     # go to Google Photos shared album
     driver.get(shared_album_url)
     downloaded_files = []
+    listing = None
 
     if check_404(driver):
         print('Page not found -- check that profile is signed in.')
 
     else:
+        # a cheap look at the top of the album before walking all of it
+        get_gallery(driver)
+        listing = get_listing(driver)
+        if is_unchanged(manifest, listing):
+            print(f'No changes since the last harvest ({listing["item_count"]} items), skipping.')
+            return None, listing
+
         # get all image and video files
         tile_values = get_all_item_tiles(driver)
         
@@ -134,7 +191,19 @@ def harvest_g_shared_album(driver: WebDriver, download_directory: Path, shared_a
         print(f'Total items found: {len(tile_values)}')
         print(f'Total videos found: {n_videos}')
                 
-        if shared_video_urls:
+        media_urls = [t[2] + G_ORIGINAL_VIDEO for t in shared_video_urls if t[2]]
+        if shared_video_urls and len(media_urls) == n_videos:
+            # straight from the content server, the browser only lends its sign-in
+            known_files = [f.name.lower() for f in get_videos_in_folder(download_directory)]
+            downloaded_files, failed = fetch_album_videos(driver, [{'url': u} for u in media_urls], download_directory,
+                                                          known_files, workers=workers, bandwidth=bandwidth,
+                                                          dry_run=dry_run)
+            if failed:
+                # not everything came down, so don't let the next harvest skip this album
+                listing = None
+
+        elif shared_video_urls:
+            # no content URLs on the tiles, so step through the viewer and download with the keyboard
             known_files = [f.name.lower() for f in get_videos_in_folder(download_directory)]
             driver.get(shared_album_url) # go back to top
             open_first_tile(driver)
@@ -154,4 +223,4 @@ def harvest_g_shared_album(driver: WebDriver, download_directory: Path, shared_a
 
                 select_next_tile(driver)
 
-        return downloaded_files
\ No newline at end of file
+    return downloaded_files, listing
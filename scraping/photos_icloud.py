@@ -9,8 +9,13 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.common.exceptions import WebDriverException
 
 from common.system import get_videos_in_folder
+from common.transfer import Bandwidth
+from scraping.downloads import (read_performance_log, network_responses, response_json, session_from_driver,
+                               fetch_album_videos)
+from scraping.manifest import make_listing, is_unchanged
 
 I_404 = 'landing-page'
 I_FRAME_CLASS = 'early-child'
@@ -28,6 +33,12 @@ I_SUBTITLE_CLASS = 'ToolbarTitle-subtitleText'
 I_DOWNLOAD_CLASS = 'DownloadButton'
 I_DOWNLOAD_ARIA = 'Download'
 
+# the page loads the album as JSON from its shared stream, and asks webasseturls where each file lives
+I_WEBSTREAM = 'sharedstreams/webstream'
+I_ASSET_URLS = 'webasseturls'
+I_POSTER = 'PosterFrame'
+I_GUID_BATCH = 25
+
 # ---------- Helpers: navigating pages ----------
 
 def check_404(driver, timeout=2) -> bool:
@@ -136,9 +147,63 @@ def inspect_and_download(driver: WebDriver, known_files: list, dry_run=False): #
     return filename, downloadable
 
 
+# ---------- Helpers: direct downloads ----------
+
+def get_stream(driver: WebDriver, shared_album_url: str) -> tuple[str, list[dict]]|None:
+    ''' The album's stream URL and its items, from the webstream reply the page loaded '''
+    album_token = shared_album_url.rsplit('#', 1)[-1]
+    responses = network_responses(read_performance_log(driver), f'{album_token}/{I_WEBSTREAM}')
+    if responses:
+        params = responses[-1]
+        try:
+            stream = response_json(driver, params['requestId'])
+        except (WebDriverException, ValueError):
+            return None
+
+        stream_url = params['response']['url'].rsplit('/', 1)[0]
+        return stream_url, stream.get('photos', [])
+
+def get_stream_videos(photos: list[dict]) -> list[dict]:
+    return [p for p in photos if p.get('mediaAssetType') == 'video']
+
+def best_derivative(video: dict) -> dict|None:
+    ''' The largest rendition of a video; the poster frame is a still '''
+    derivatives = [d for name, d in video.get('derivatives', {}).items() if name != I_POSTER]
+    return max(derivatives, key=lambda d: int(d.get('fileSize') or 0), default=None)
+
+def get_video_jobs(session, stream_url: str, videos: list[dict]) -> list[dict]:
+    ''' Download URL and size of each video, asking webasseturls in batches; any it leaves out are counted '''
+    jobs = []
+    for i in range(0, len(videos), I_GUID_BATCH):
+        batch = videos[i:i + I_GUID_BATCH]
+        response = session.post(f'{stream_url}/{I_ASSET_URLS}', json={'photoGuids': [v['photoGuid'] for v in batch]},
+                                timeout=30)
+        response.raise_for_status()
+        reply = response.json()
+
+        for video in batch:
+            derivative = best_derivative(video)
+            item = reply.get('items', {}).get(derivative['checksum']) if derivative else None
+            if item:
+                location = reply['locations'][item['url_location']]
+                jobs.append({'url': f'{location["scheme"]}://{location["hosts"][0]}{item["url_path"]}',
+                             'size': int(derivative.get('fileSize') or 0) or None})
+
+    if (missing := len(videos) - len(jobs)):
+        print(f'No download URL for {missing} of {len(videos)} videos, leaving them for the next harvest.')
+    return jobs
+
 # ---------- Main block ----------
 
-def harvest_i_shared_album(driver: WebDriver, download_directory: Path, shared_album_url: str, dry_run=False):
+def harvest_i_shared_album(driver: WebDriver, download_directory: Path, shared_album_url: str, dry_run=False,
+                           workers=4, bandwidth: Bandwidth|None=None, manifest: dict|None=None):
+    '''
+    Download an album's new videos, unless its count and leading items match manifest from the last harvest.
+    Returns the names downloaded and the album's listing to record once they are safely in.
+    '''
+    downloaded_files = None
+    listing = None
+
     # go to iCloud Photos shared URL
     print(f'Navigating to {shared_album_url} ...')
     driver.get(shared_album_url)
@@ -151,7 +216,29 @@ def harvest_i_shared_album(driver: WebDriver, download_directory: Path, shared_a
         if not get_gallery(driver, shared_album_url):
             print('Album failed to load.')
 
+        elif (stream := get_stream(driver, shared_album_url)):
+            # the stream already lists every item, so an unchanged album costs nothing more
+            stream_url, photos = stream
+            listing = make_listing(len(photos), [p.get('photoGuid') for p in photos])
+            if is_unchanged(manifest, listing):
+                print(f'No changes since the last harvest ({listing["item_count"]} items), skipping.')
+                return None, listing
+
+            # straight from the asset servers, the browser only found the album
+            videos = get_stream_videos(photos)
+            print(f'Total videos found: {len(videos)}')
+            known_files = [f.stem.lower() for f in get_videos_in_folder(download_directory)] ## iCloud Photos obscures file extension
+            session = session_from_driver(driver, workers)
+            jobs = get_video_jobs(session, stream_url, videos)
+            session.close()
+            downloaded_files, failed = fetch_album_videos(driver, jobs, download_directory, known_files,
+                                                          workers=workers, bandwidth=bandwidth, dry_run=dry_run)
+            if failed or len(jobs) < len(videos):
+                # not everything came down, so don't let the next harvest skip this album
+                listing = None
+
         else:
+            # no stream captured, so step through the viewer and click download
             # open first item
             grid_items = get_grid_items(driver)
             if not grid_items:
@@ -189,4 +276,4 @@ def harvest_i_shared_album(driver: WebDriver, download_directory: Path, shared_a
                         time.sleep(1)
                         in_queue = 0
 
-                return downloaded_files
\ No newline at end of file
+    return downloaded_files, listing
\ No newline at end of file
@@ -0,0 +1,16 @@
+import pytest
+
+class RecordingUI:
+    '''Stands in for common.console.SplitConsole, keeping what would be shown.'''
+    def __init__(self):
+        self.updates = []
+
+    def add_update(self, message, file=None):
+        self.updates.append(message)
+
+    def set_status(self, message):
+        pass
+
+@pytest.fixture
+def ui():
+    return RecordingUI()
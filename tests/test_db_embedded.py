@@ -0,0 +1,25 @@
+from pandas import DataFrame
+
+from database.db_embedded import get_embedded_engine
+from database.db_project import update_folders, update_files, fetch_files
+
+def test_root_files_upsert_once():
+    engine = get_embedded_engine()
+    folders = DataFrame([{'folder_name': None, 'project_year': 2024, 'media_type': 'home_movies'}])
+    files = DataFrame([{'folder_name': None, 'project_year': 2024, 'media_type': 'home_movies',
+                        'subfolder_name': None, 'file_name': 'IMG_0001.MOV', 'file_size': 12.5,
+                        'video_date': None, 'video_duration': 30, 'video_resolution': '1080p',
+                        'video_rating': None, 'content_hash': None, 'video_fingerprint': None,
+                        'file_bytes': 13107200, 'file_mtime_ns': 0,
+                        'stored': 'local'}])
+
+    for file_size in [12.5, 13.0]:
+        update_folders(engine, folders)
+        update_files(engine, files.assign(file_size=file_size))
+
+    stored = fetch_files(engine, 2024, 'home_movies')
+    assert len(stored) == 1
+    assert stored['file_size'].iloc[0] == 13.0
+    # root-level names read back as NULL, the same as from Postgres
+    assert stored['folder_name'].iloc[0] is None
+    assert stored['subfolder_name'].iloc[0] is None
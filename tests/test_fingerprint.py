@@ -0,0 +1,39 @@
+import random
+
+from common.fingerprint import FingerprintIndex, MAX_DISTANCE, N_FRAMES, HASH_HEX
+
+def make_fingerprint(frames:list[int]) -> str:
+    return ''.join(f'{frame:0{HASH_HEX}x}' for frame in frames)
+
+def flip_bits(frame:int, n_bits:int, rng:random.Random, low_bit:int=0) -> int:
+    for bit in rng.sample(range(low_bit, 64), n_bits):
+        frame ^= 1 << bit
+    return frame
+
+def test_near_duplicates_within_max_distance():
+    rng = random.Random(0)
+    clip = [rng.getrandbits(64) for _ in range(N_FRAMES)]
+    reencode = [flip_bits(f, MAX_DISTANCE // 2, rng) for f in clip]
+    other = [rng.getrandbits(64) for _ in range(N_FRAMES)]
+
+    index = FingerprintIndex()
+    index.add('clip.mov', make_fingerprint(clip))
+    index.add('clip 720p.mp4', make_fingerprint(reencode))
+    index.add('other.mov', make_fingerprint(other))
+
+    pairs = index.near_duplicates()
+    assert [(a, b) for a, b, _ in pairs] == [('clip 720p.mp4', 'clip.mov')]
+    assert pairs[0][2] == MAX_DISTANCE // 2
+    assert [key for key, _ in index.find(make_fingerprint(reencode))] == ['clip 720p.mp4', 'clip.mov']
+
+def test_distant_clips_are_not_paired():
+    rng = random.Random(1)
+    clip = [rng.getrandbits(64) for _ in range(N_FRAMES)]
+    # the lowest band left alone so they still share buckets and get compared
+    edited = [flip_bits(f, MAX_DISTANCE + 2, rng, low_bit=16) for f in clip]
+
+    index = FingerprintIndex()
+    index.add('a', make_fingerprint(clip))
+    index.add('b', make_fingerprint(edited))
+    assert any(len(keys) == 2 for keys in index.buckets.values())
+    assert index.near_duplicates() == []
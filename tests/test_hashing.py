@@ -0,0 +1,38 @@
+from common.hashing import content_hash, HashIndex, FULL_HASH_LIMIT
+
+def test_same_content_same_hash(tmp_path):
+    data = bytes(range(256)) * 100
+    original = tmp_path / 'IMG_0001.MOV'
+    original.write_bytes(data)
+    renamed = tmp_path / 'copy of IMG_0001.MOV'
+    renamed.write_bytes(data)
+    changed = tmp_path / 'IMG_0002.MOV'
+    changed.write_bytes(data[:-1] + b'\x00')
+
+    assert content_hash(original) == content_hash(renamed)
+    assert content_hash(original) != content_hash(changed)
+
+def test_sampled_hash_of_large_files(tmp_path):
+    data = bytearray(FULL_HASH_LIMIT * 2)
+    original = tmp_path / 'long.mp4'
+    original.write_bytes(data)
+    copy = tmp_path / 'long copy.mp4'
+    copy.write_bytes(data)
+    data[len(data) // 2] = 1
+    changed = tmp_path / 'long edited.mp4'
+    changed.write_bytes(data)
+
+    assert content_hash(original) == content_hash(copy)
+    assert content_hash(original) != content_hash(changed)
+
+def test_index_finds_other_copies(tmp_path):
+    original = tmp_path / 'a.mp4'
+    original.write_bytes(b'same bytes')
+    copy = tmp_path / 'b.mp4'
+    copy.write_bytes(b'same bytes')
+
+    index = HashIndex()
+    file_hash = index.add(original)
+    assert index.find(file_hash, exclude=original) is None
+    assert index.match(copy) == original
+    assert index.add(original) == file_hash and len(index.paths[file_hash]) == 1
@@ -0,0 +1,59 @@
+import os
+
+from pandas import DataFrame
+
+import common.journal
+from common.journal import start_plan, record_copies, record_move, record_db, save_plan, load_plan, stale_steps
+from database.db_embedded import get_embedded_engine
+from database.db_project import fetch_files
+from repositories.replay import apply_plan
+
+FILES = DataFrame([{'folder_name': 'Sam 2024', 'project_year': 2024, 'media_type': 'home_movies',
+                    'subfolder_name': None, 'file_name': 'IMG_0001.MOV', 'file_size': 12.5,
+                    'video_date': None, 'video_duration': 30, 'video_resolution': '1080p',
+                    'video_rating': None, 'content_hash': None, 'video_fingerprint': None,
+                    'file_bytes': 13107200, 'file_mtime_ns': 0, 'stored': 'local'}])
+
+def plan_run(tmp_path, monkeypatch):
+    ''' A dry run's steps: one copy, one quarantine move and two database writes, saved and read back '''
+    monkeypatch.setattr(common.journal, '_plan', None)
+    source = tmp_path / 'google' / 'IMG_0001.MOV'
+    dupe = tmp_path / 'google' / 'IMG_0001 (1).MOV'
+    source.parent.mkdir()
+    source.write_bytes(b'video')
+    dupe.write_bytes(b'video')
+    copy_to = tmp_path / 'onedrive' / 'IMG_0001.MOV'
+    move_to = tmp_path / 'quarantine' / 'IMG_0001 (1).MOV'
+
+    start_plan()
+    record_copies([(source, copy_to)])
+    record_move(dupe, move_to)
+    record_db('update_folders', FILES[['folder_name', 'project_year', 'media_type']], depends_on=[source])
+    record_db('update_files', FILES, depends_on=[source])
+    save_plan(tmp_path / 'plan.json')
+
+    return load_plan(tmp_path / 'plan.json'), source, dupe, copy_to, move_to
+
+def test_plan_replays_the_same_moves(tmp_path, monkeypatch, ui):
+    steps, source, dupe, copy_to, move_to = plan_run(tmp_path, monkeypatch)
+    assert [s['action'] for s in steps] == ['copy', 'move', 'db', 'db']
+    assert stale_steps(steps) == []
+
+    # nothing touched until the plan is applied
+    assert not copy_to.exists() and dupe.exists()
+
+    engine = get_embedded_engine()
+    apply_plan(engine, steps, ui)
+
+    assert copy_to.read_bytes() == b'video' and source.exists()
+    assert move_to.read_bytes() == b'video' and not dupe.exists()
+    stored = fetch_files(engine, 2024, 'home_movies')
+    assert stored[['folder_name', 'file_name']].values.tolist() == [['Sam 2024', 'IMG_0001.MOV']]
+
+def test_changed_source_makes_plan_stale(tmp_path, monkeypatch):
+    steps, source, *_ = plan_run(tmp_path, monkeypatch)
+    source.write_bytes(b'edited video')
+    os.utime(source, ns=(0, 0)) # a new mtime even on coarse filesystem clocks
+
+    # the copy and both database writes were planned from the old file
+    assert [i for i, _ in stale_steps(steps)] == [0, 2, 3]
@@ -0,0 +1,27 @@
+import common.transfer
+import repositories.migrate
+from repositories.migrate import copy_from_gdrive
+
+def test_failed_copy_is_reported(tmp_path, monkeypatch, ui):
+    google_drive = tmp_path / 'google'
+    one_drive = tmp_path / 'onedrive'
+    person = google_drive / '2024' / 'Sam 2024'
+    person.mkdir(parents=True)
+    (person / 'good.mp4').write_bytes(b'a' * 100)
+    (person / 'bad.mp4').write_bytes(b'b' * 200)
+
+    copy_file = common.transfer.copy_file
+    def failing_copy(source, destination, bandwidth=None):
+        if source.name == 'bad.mp4':
+            raise OSError('drive went offline')
+        return copy_file(source, destination, bandwidth)
+
+    monkeypatch.setattr(repositories.migrate, 'mount_g_drive', lambda: None)
+    monkeypatch.setattr(common.transfer, 'copy_file', failing_copy)
+
+    copy_from_gdrive(one_drive, google_drive, tmp_path / 'quarantine', 'Quarantine', ui, dry_run=False)
+
+    assert (one_drive / '2024' / 'Sam 2024' / 'good.mp4').exists()
+    assert not (one_drive / '2024' / 'Sam 2024' / 'bad.mp4').exists()
+    assert any('Could not copy' in u and 'bad.mp4' in u for u in ui.updates)
+    assert '1 video copied from Sam 2024' in ui.updates
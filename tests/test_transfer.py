@@ -0,0 +1,14 @@
+from common.transfer import copy_files
+
+def test_missing_source_fails_alone(tmp_path):
+    present = tmp_path / 'present.mp4'
+    present.write_bytes(b'x' * 1000)
+    missing = tmp_path / 'missing.mp4'
+    destination = tmp_path / 'out'
+    destination.mkdir()
+
+    copied, failed = copy_files([(present, destination / present.name), (missing, destination / missing.name)])
+
+    assert copied == [destination / present.name]
+    assert (destination / present.name).read_bytes() == present.read_bytes()
+    assert [source for source, _ in failed] == [missing]